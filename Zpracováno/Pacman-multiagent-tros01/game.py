@@ -23,9 +23,16 @@
 from util import *
 import time
 import os
+import hashlib
 import traceback
 import sys
 
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except:
+    _NUMPY_ENABLED = False
+
 #######################
 # Parts worth reading #
 #######################
@@ -71,6 +78,11 @@ class Directions:
                WEST: EAST,
                STOP: STOP}
 
+    # Small-int codes used internally by game.py and pacman.py, in the order
+    # legal actions are listed.  The public API keeps using the strings above.
+    NAMES = (WEST, STOP, EAST, NORTH, SOUTH)
+    CODES = dict([(name, code) for code, name in enumerate(NAMES)])
+
 
 class Configuration:
     """
@@ -80,6 +92,7 @@ class Configuration:
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
     """
+    __slots__ = ('pos', 'direction')
 
     def __init__(self, pos, direction):
         self.pos = pos
@@ -123,21 +136,51 @@ class Configuration:
             direction = self.direction  # There is no stop direction
         return Configuration((x + dx, y+dy), direction)
 
+    def generateSuccessorByCode(self, code, speed=1):
+        """
+        Like generateSuccessor, for a move in the direction with the given
+        code (see Directions.CODES) at the given speed.
+        """
+        x, y = self.pos
+        dx, dy = Actions._vectorsByCode[code]
+        if code == Actions._stopCode:
+            direction = self.direction  # There is no stop direction
+        else:
+            direction = Directions.NAMES[code]
+        return Configuration((x + dx * speed, y + dy * speed), direction)
+
 
 class AgentState:
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
+
+    The start configuration and isPacman never change during a game, so they
+    are kept in one tuple shared by every copy of the agent's state.
     """
+    __slots__ = ('_fixed', 'configuration', 'scaredTimer', 'numCarrying', 'numReturned')
 
     def __init__(self, startConfiguration, isPacman):
-        self.start = startConfiguration
+        self._fixed = (startConfiguration, isPacman)
         self.configuration = startConfiguration
-        self.isPacman = isPacman
         self.scaredTimer = 0
         # state below potentially used for contest only
         self.numCarrying = 0
         self.numReturned = 0
 
+    def _getStart(self):
+        return self._fixed[0]
+
+    def _setStart(self, start):
+        self._fixed = (start, self._fixed[1])
+    start = property(_getStart, _setStart)
+
+    def _getIsPacman(self):
+        return self._fixed[1]
+
+    def _setIsPacman(self, isPacman):
+        self._fixed = (self._fixed[0], isPacman)
+    isPacman = property(_getIsPacman, _setIsPacman)
+
     def __str__(self):
         if self.isPacman:
             return "Pacman: " + str(self.configuration)
@@ -153,7 +196,8 @@ class AgentState:
         return hash(hash(self.configuration) + 13 * hash(self.scaredTimer))
 
     def copy(self):
-        state = AgentState(self.start, self.isPacman)
+        state = AgentState.__new__(AgentState)
+        state._fixed = self._fixed
         state.configuration = self.configuration
         state.scaredTimer = self.scaredTimer
         state.numCarrying = self.numCarrying
@@ -177,6 +221,8 @@ class Grid:
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
+    # Set by makeReadOnly
+    _readOnly = False
 
     def __init__(self, width, height, initialValue=False, bitRepresentation=None):
         if initialValue not in [False, True]:
@@ -194,8 +240,19 @@ class Grid:
         return self.data[i]
 
     def __setitem__(self, key, item):
+        if self._readOnly:
+            raise Exception('This Grid is read-only; change a copy() of it instead')
         self.data[key] = item
 
+    def makeReadOnly(self):
+        """
+        Makes the grid read-only, for grids that every state shares (such as
+        a Layout's walls): writing to it or to one of its columns raises.
+        copy() still returns a writable grid.
+        """
+        self.data = [tuple(column) for column in self.data]
+        self._readOnly = True
+
     def __str__(self):
         out = [[str(self.data[x][y])[0] for x in range(self.width)]
                for y in range(self.height)]
@@ -205,7 +262,13 @@ class Grid:
     def __eq__(self, other):
         if other == None:
             return False
-        return self.data == other.data
+        if not isinstance(other, Grid):
+            # Lets BitGrid.__eq__ compare the two
+            return NotImplemented
+        if self.data == other.data:
+            return True
+        # Read-only grids keep their columns as tuples
+        return [list(column) for column in self.data] == [list(column) for column in other.data]
 
     def __hash__(self):
         # return hash(str(self))
@@ -220,7 +283,7 @@ class Grid:
 
     def copy(self):
         g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g.data = [list(x) for x in self.data]
         return g
 
     def deepCopy(self):
@@ -293,6 +356,153 @@ class Grid:
         return bools
 
 
+class BitGrid:
+    """
+    A boolean Grid packed into a single arbitrary-precision int.  Cell (x,y)
+    lives in bit x * height + y, so cells are still read and written through
+    grid[x][y], but copy() is O(1), count() is a popcount, the hash is the
+    int itself and asList() only visits the cells that are set.
+    """
+    __slots__ = ('width', 'height', 'bits')
+
+    def __init__(self, width, height, initialValue=False, bits=0):
+        if initialValue not in [False, True]:
+            raise Exception('Grids can only contain booleans')
+        self.width = width
+        self.height = height
+        if initialValue:
+            bits = self._mask()
+        self.bits = bits
+
+    def _mask(self):
+        return (1 << (self.width * self.height)) - 1
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.width
+        if not 0 <= x < self.width:
+            raise IndexError('grid index out of range')
+        return _BitGridColumn(self, x)
+
+    def __setitem__(self, x, column):
+        for y, item in enumerate(column):
+            self[x][y] = item
+
+    def __iter__(self):
+        for x in range(self.width):
+            yield _BitGridColumn(self, x)
+
+    def __len__(self):
+        return self.width
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)]
+               for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None:
+            return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.width == other.width and self.height == other.height
+        if not isinstance(other, Grid):
+            return NotImplemented
+        return [list(column) for column in self] == [list(column) for column in other.data]
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        g = BitGrid.__new__(BitGrid)
+        g.width = self.width
+        g.height = self.height
+        g.bits = self.bits
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        return self.copy()
+
+    def count(self, item=True):
+        ones = bin(self.bits).count('1')
+        if item:
+            return ones
+        return self.width * self.height - ones
+
+    def asList(self, key=True):
+        bits = self.bits if key else ~self.bits & self._mask()
+        height = self.height
+        list = []
+        while bits:
+            low = bits & -bits
+            index = low.bit_length() - 1
+            list.append((index // height, index % height))
+            bits ^= low
+        return list
+
+    def toArray(self):
+        """
+        Returns the grid as a (width, height) uint8 NumPy array.
+        """
+        return BitGrid.stackArrays([self])[0]
+
+    def stackArrays(grids):
+        """
+        Returns a (len(grids), width, height) uint8 NumPy array of grids of
+        the same size, unpacked in one pass over their packed bytes.
+        """
+        if not _NUMPY_ENABLED:
+            raise Exception('BitGrid arrays need numpy')
+        width, height = grids[0].width, grids[0].height
+        size = width * height
+        numBytes = (size + 7) // 8
+        raw = b''.join([grid.bits.to_bytes(numBytes, 'little') for grid in grids])
+        packed = numpy.frombuffer(raw, numpy.uint8).reshape(len(grids), numBytes)
+        unpacked = numpy.unpackbits(packed, axis=1, bitorder='little')[:, :size]
+        return unpacked.reshape(len(grids), width, height)
+    stackArrays = staticmethod(stackArrays)
+
+
+class _BitGridColumn:
+    """
+    The grid[x] view of a BitGrid, so that grid[x][y] reads and writes bits.
+    """
+    __slots__ = ('grid', 'offset')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.offset = x * grid.height
+
+    def _bit(self, y):
+        height = self.grid.height
+        if y < 0:
+            y += height
+        if not 0 <= y < height:
+            raise IndexError('grid index out of range')
+        return 1 << (self.offset + y)
+
+    def __getitem__(self, y):
+        return self.grid.bits & self._bit(y) != 0
+
+    def __setitem__(self, y, item):
+        bit = self._bit(y)
+        if item:
+            self.grid.bits |= bit
+        else:
+            self.grid.bits &= ~bit
+
+    def __iter__(self):
+        bits = self.grid.bits >> self.offset
+        for y in range(self.grid.height):
+            yield bits & (1 << y) != 0
+
+    def __len__(self):
+        return self.grid.height
+
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1, 2)):
         return bitRep
@@ -317,20 +527,38 @@ class Actions:
 
     _directionsAsList = [('West', (-1, 0)), ('Stop', (0, 0)), ('East', (1, 0)), ('North', (0, 1)), ('South', (0, -1))]
 
+    # Tables indexed by Directions.CODES
+    _vectorsByCode = tuple([vector for name, vector in _directionsAsList])
+    _reverseByCode = tuple([Directions.CODES[Directions.REVERSE[name]] for name in Directions.NAMES])
+    _leftByCode = tuple([Directions.CODES[Directions.LEFT[name]] for name in Directions.NAMES])
+    _rightByCode = tuple([Directions.CODES[Directions.RIGHT[name]] for name in Directions.NAMES])
+    _stopCode = Directions.CODES[Directions.STOP]
+
     TOLERANCE = .001
 
+    def directionToCode(direction):
+        return Directions.CODES[direction]
+    directionToCode = staticmethod(directionToCode)
+
+    def codeToDirection(code):
+        return Directions.NAMES[code]
+    codeToDirection = staticmethod(codeToDirection)
+
     def reverseDirection(action):
-        if action == Directions.NORTH:
-            return Directions.SOUTH
-        if action == Directions.SOUTH:
-            return Directions.NORTH
-        if action == Directions.EAST:
-            return Directions.WEST
-        if action == Directions.WEST:
-            return Directions.EAST
-        return action
+        code = Directions.CODES.get(action)
+        if code is None:
+            return action
+        return Directions.NAMES[Actions._reverseByCode[code]]
     reverseDirection = staticmethod(reverseDirection)
 
+    def leftDirection(action):
+        return Directions.NAMES[Actions._leftByCode[Directions.CODES[action]]]
+    leftDirection = staticmethod(leftDirection)
+
+    def rightDirection(action):
+        return Directions.NAMES[Actions._rightByCode[Directions.CODES[action]]]
+    rightDirection = staticmethod(rightDirection)
+
     def vectorToDirection(vector):
         dx, dy = vector
         if dy > 0:
@@ -345,7 +573,7 @@ class Actions:
     vectorToDirection = staticmethod(vectorToDirection)
 
     def directionToVector(direction, speed=1.0):
-        dx, dy = Actions._directions[direction]
+        dx, dy = Actions._vectorsByCode[Directions.CODES[direction]]
         return (dx * speed, dy * speed)
     directionToVector = staticmethod(directionToVector)
 
@@ -358,12 +586,9 @@ class Actions:
         if (abs(x - x_int) + abs(y - y_int) > Actions.TOLERANCE):
             return [config.getDirection()]
 
-        for dir, vec in Actions._directionsAsList:
-            dx, dy = vec
-            next_y = y_int + dy
-            next_x = x_int + dx
-            if not walls[next_x][next_y]:
-                possible.append(dir)
+        for code, (dx, dy) in enumerate(Actions._vectorsByCode):
+            if not walls[x_int + dx][y_int + dy]:
+                possible.append(Directions.NAMES[code])
 
         return possible
 
@@ -393,7 +618,52 @@ class Actions:
     getSuccessor = staticmethod(getSuccessor)
 
 
+class Zobrist:
+    """
+    Lazily filled table of random 64-bit keys used to hash GameStateData.
+
+    A state's key is the XOR of the keys of its features (agent
+    configurations, scared timers, food, capsules and score), so a successor
+    can derive its key from its parent's by XORing out what changed.  Each
+    key is a digest of the feature itself, so keys are the same in every
+    process and run (recorded games store them as checksums), and hashing
+    never disturbs the global random module that games and the autograder
+    seed.
+    """
+    _keys = {}
+
+    def key(feature):
+        key = Zobrist._keys.get(feature)
+        if key is None:
+            text = repr(Zobrist._canonical(feature)).encode('utf-8')
+            key = int.from_bytes(hashlib.blake2b(text, digest_size=8).digest(), 'big')
+            Zobrist._keys[feature] = key
+        return key
+    key = staticmethod(key)
+
+    def _canonical(feature):
+        # Equal features must digest alike: (1, 2) and (1.0, 2.0) are the same
+        # position, so every number is spelled as a float.
+        if isinstance(feature, tuple):
+            return tuple([Zobrist._canonical(part) for part in feature])
+        if isinstance(feature, (int, float)) and not isinstance(feature, bool):
+            return float(feature)
+        return feature
+    _canonical = staticmethod(_canonical)
+
+    def agentKey(index, configuration, scaredTimer):
+        if configuration == None:
+            key = 0
+        else:
+            key = Zobrist.key(('agent', index, configuration.pos, configuration.direction))
+        return key ^ Zobrist.key(('scared', index, scaredTimer))
+    agentKey = staticmethod(agentKey)
+
+
 class GameStateData:
+    __slots__ = ('food', 'capsules', 'agentStates', 'layout', 'score', 'scoreChange',
+                 '_eaten', '_foodEaten', '_foodAdded', '_capsuleEaten', '_agentMoved',
+                 '_lose', '_win', '_zobristKey', '_numFood', '_foodPositions')
 
     def __init__(self, prevState=None):
         """
@@ -401,11 +671,18 @@ class GameStateData:
         """
         if prevState != None:
             self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
+            self.capsules = prevState.capsules  # Copied on write by PacmanRules.consume
             self.agentStates = self.copyAgentStates(prevState.agentStates)
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._zobristKey = prevState._zobristKey
+            self._numFood = prevState._numFood
+            self._foodPositions = prevState._foodPositions
+        else:
+            self._zobristKey = None
+            self._numFood = None
+            self._foodPositions = None
 
         self._foodEaten = None
         self._foodAdded = None
@@ -418,13 +695,38 @@ class GameStateData:
     def deepCopy(self):
         state = GameStateData(self)
         state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
+        # Successors share these lists until they change them; a deep copy
+        # must not
+        state.capsules = self.capsules[:]
+        state._eaten = self._eaten[:]
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def getFoodCount(self):
+        """
+        Returns the number of food pellets left, kept up to date as food is
+        eaten rather than counted from the grid.
+        """
+        if self._numFood == None:
+            self._numFood = self.food.count()
+        return self._numFood
+
+    def getFoodPositions(self):
+        """
+        Returns a frozenset of the (x,y) positions that still hold food.
+
+        The set is built from the grid on first use and then handed down:
+        a successor that eats nothing shares its parent's set in O(1), and
+        one that eats a pellet copies it without that position in O(F) for
+        F pellets left, never rescanning the W x H grid.
+        """
+        if self._foodPositions == None:
+            self._foodPositions = frozenset(self.food.asList())
+        return self._foodPositions
+
     def copyAgentStates(self, agentStates):
         copiedStates = []
         for agentState in agentStates:
@@ -452,13 +754,53 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        if self._zobristKey == None:
+            self._zobristKey = self.computeZobristKey()
+        return self._zobristKey
+
+    def computeZobristKey(self):
+        """
+        Computes the 64-bit Zobrist key of this state from scratch.
+        """
+        key = Zobrist.key(('score', self.score))
+        for index, agentState in enumerate(self.agentStates):
+            key ^= Zobrist.agentKey(index, agentState.configuration, agentState.scaredTimer)
+        for x, y in self.food.asList():
+            key ^= Zobrist.key(('food', x, y))
+        for x, y in self.capsules:
+            key ^= Zobrist.key(('capsule', x, y))
+        return key
+
+    def updateZobristKey(self, prevState):
+        """
+        Derives this state's key from prevState's, the data it was copied
+        from, by XORing out the features that changed since then.
+        """
+        prevAgents = [(agentState.configuration, agentState.scaredTimer)
+                      for agentState in prevState.agentStates]
+        self.deriveZobristKey(prevState._zobristKey, prevState.score, prevAgents)
+
+    def deriveZobristKey(self, key, score, prevAgents):
+        """
+        Updates this state's key from the key and score of the state it was
+        derived from and that state's (configuration, scaredTimer) pairs.
+        """
+        if key == None:
+            self._zobristKey = None
+            return
+        for index, agentState in enumerate(self.agentStates):
+            configuration, scaredTimer = prevAgents[index]
+            if agentState.configuration is not configuration or agentState.scaredTimer != scaredTimer:
+                key ^= Zobrist.agentKey(index, configuration, scaredTimer)
+                key ^= Zobrist.agentKey(index, agentState.configuration, agentState.scaredTimer)
+        if self._foodEaten != None:
+            key ^= Zobrist.key(('food',) + tuple(self._foodEaten))
+        if self._capsuleEaten != None:
+            key ^= Zobrist.key(('capsule',) + tuple(self._capsuleEaten))
+        if self.score != score:
+            key ^= Zobrist.key(('score', score))
+            key ^= Zobrist.key(('score', self.score))
+        self._zobristKey = key
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -520,7 +862,7 @@ class GameStateData:
         """
         self.food = layout.food.copy()
         #self.capsules = []
-        self.capsules = layout.capsules[:]
+        self.capsules = list(layout.capsules)
         self.layout = layout
         self.score = 0
         self.scoreChange = 0
@@ -536,6 +878,9 @@ class GameStateData:
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
         self._eaten = [False for a in self.agentStates]
+        self._zobristKey = self.computeZobristKey()
+        self._numFood = self.food.count()
+        self._foodPositions = frozenset(self.food.asList())
 
 
 try:
@@ -550,7 +895,7 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False):
+    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False, deepCopyStates=False, turbo=False, recordMoves=True):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -559,6 +904,10 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.deepCopyStates = deepCopyStates
+        self.turbo = turbo
+        self.recordMoves = recordMoves
+        self.recorder = None
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
@@ -580,6 +929,16 @@ class Game:
         self.agentCrashed = True
         self.rules.agentCrash(self, agentIndex)
 
+    def _agentView(self):
+        """
+        Returns the state handed to an agent: a cheap read-only view of the
+        current state, or a full deep copy when deepCopyStates is set (for
+        agents that may modify the state they are given).
+        """
+        if self.deepCopyStates:
+            return self.state.deepCopy()
+        return self.state.readOnlyView()
+
     OLD_STDOUT = None
     OLD_STDERR = None
 
@@ -601,10 +960,23 @@ class Game:
         sys.stdout = OLD_STDOUT
         sys.stderr = OLD_STDERR
 
+    def _announceTimeLimits(self):
+        """
+        Tells agents that budget their own time the per-move limits of the
+        rules.
+        """
+        for i in range(len(self.agents)):
+            setLimits = getattr(self.agents[i], 'setMoveTimeLimits', None)
+            if setLimits is not None:
+                setLimits(self.rules.getMoveWarningTime(i), self.rules.getMoveTimeout(i))
+
     def run(self):
         """
         Main control loop for game play.
         """
+        self._announceTimeLimits()
+        if self.turbo:
+            return self._runTurbo()
         self.display.initialize(self.state.data)
         self.numMoves = 0
 
@@ -628,7 +1000,7 @@ class Game:
                             agent.registerInitialState, int(self.rules.getMaxStartupTime(i)))
                         try:
                             start_time = time.time()
-                            timed_func(self.state.deepCopy())
+                            timed_func(self._agentView())
                             time_taken = time.time() - start_time
                             self.totalAgentTimes[i] += time_taken
                         except TimeoutFunctionException:
@@ -643,7 +1015,7 @@ class Game:
                         self.unmute()
                         return
                 else:
-                    agent.registerInitialState(self.state.deepCopy())
+                    agent.registerInitialState(self._agentView())
                 # TODO: could this exceed the total time
                 self.unmute()
 
@@ -664,7 +1036,7 @@ class Game:
                             self.rules.getMoveTimeout(agentIndex)))
                         try:
                             start_time = time.time()
-                            observation = timed_func(self.state.deepCopy())
+                            observation = timed_func(self._agentView())
                         except TimeoutFunctionException:
                             skip_action = True
                         move_time += time.time() - start_time
@@ -675,10 +1047,10 @@ class Game:
                         return
                 else:
                     observation = agent.observationFunction(
-                        self.state.deepCopy())
+                        self._agentView())
                 self.unmute()
             else:
-                observation = self.state.deepCopy()
+                observation = self._agentView()
 
             # Solicit an action
             action = None
@@ -733,7 +1105,8 @@ class Game:
             self.unmute()
 
             # Execute the action
-            self.moveHistory.append((agentIndex, action))
+            if self.recordMoves:
+                self.moveHistory.append((agentIndex, action))
             if self.catchExceptions:
                 try:
                     self.state = self.state.generateSuccessor(
@@ -745,6 +1118,8 @@ class Game:
                     return
             else:
                 self.state = self.state.generateSuccessor(agentIndex, action)
+            if self.recorder != None:
+                self.recorder.record(agentIndex, action, self.state)
 
             # Change the display
             self.display.update(self.state.data)
@@ -754,7 +1129,7 @@ class Game:
             # Allow for game specific conditions (winning, losing, etc.)
             self.rules.process(self.state, self)
             # Track progress
-            if agentIndex == numAgents + 1:
+            if agentIndex == numAgents - 1:
                 self.numMoves += 1
             # Next agent
             agentIndex = (agentIndex + 1) % numAgents
@@ -776,3 +1151,59 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def _runTurbo(self):
+        """
+        Control loop for headless batch play.
+
+        Agent hooks are looked up once per game, and there is no display, no
+        stdout redirection and no timing.  When catchExceptions is set an
+        agent exception still ends the game as a crash, but time limits are
+        not enforced.
+        """
+        self.numMoves = 0
+        agents = self.agents
+        numAgents = len(agents)
+        for i in range(numAgents):
+            if not agents[i]:
+                self._agentCrash(i, quiet=True)
+                return
+        observers = [getattr(agent, 'observationFunction', None) for agent in agents]
+        getActions = [agent.getAction for agent in agents]
+        moveHistory = self.moveHistory if self.recordMoves else None
+        recorder = self.recorder
+        process = self.rules.process
+
+        agentIndex = self.startingIndex
+        try:
+            for i in range(numAgents):
+                register = getattr(agents[i], 'registerInitialState', None)
+                if register is not None:
+                    agentIndex = i
+                    register(self._agentView())
+
+            agentIndex = self.startingIndex
+            while not self.gameOver:
+                observation = self._agentView()
+                if observers[agentIndex] is not None:
+                    observation = observers[agentIndex](observation)
+                action = getActions[agentIndex](observation)
+                if moveHistory is not None:
+                    moveHistory.append((agentIndex, action))
+                self.state = self.state.generateSuccessor(agentIndex, action)
+                if recorder is not None:
+                    recorder.record(agentIndex, action, self.state)
+                process(self.state, self)
+                if agentIndex == numAgents - 1:
+                    self.numMoves += 1
+                agentIndex = (agentIndex + 1) % numAgents
+
+            for i in range(numAgents):
+                final = getattr(agents[i], 'final', None)
+                if final is not None:
+                    agentIndex = i
+                    final(self.state)
+        except Exception:
+            if not self.catchExceptions:
+                raise
+            self._agentCrash(agentIndex)
@@ -0,0 +1,335 @@
+# gameReplay.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Compact binary recordings of Pacman games.
+
+A recording is a fixed header followed by a stream of records, and ends
+with an index of its checkpoints:
+
+  header      magic 'PACR', version, flags, the layout's sha1 content hash,
+              the game seed, the number of agents and, if flagged, the
+              layout text itself
+  move        the action's direction code (see Directions.CODES) and the
+              low 16 bits of the Zobrist key of the state after the move
+  checkpoint  a tag byte, the number of moves played and the pickled
+              GameStateData at that point, every checkpointInterval moves
+  index       a tag byte, the (move number, file offset) of every
+              checkpoint, and a fixed footer locating the index
+
+Agents move in turn starting from Pacman, so agent indices are not stored.
+The per-move checksums let a replay detect the first move at which the
+rules or the layout disagree with the recording, and the checkpoints let
+it start at any move after replaying at most checkpointInterval moves.  A
+recording cut short (say by a crash) has no index; its checkpoints are
+then found by scanning.  To check recordings without a display:
+
+  python gameReplay.py recorded-game-1*
+"""
+import pickle
+import struct
+import sys
+import time
+from game import Actions, Directions
+
+MAGIC = b'PACR'
+VERSION = 2
+FLAG_LAYOUT_TEXT = 1
+FLAG_SEED = 2
+TAG_CHECKPOINT = 0xC0
+TAG_INDEX = 0xE0
+INDEX_MAGIC = b'PIDX'
+DEFAULT_CHECKPOINT_INTERVAL = 100
+
+_HEADER = struct.Struct('<4sBB20sQB')
+_TEXT_LENGTH = struct.Struct('<I')
+_MOVE = struct.Struct('<BH')
+_CHECKPOINT = struct.Struct('<BII')
+_INDEX_ENTRY = struct.Struct('<IQ')
+_FOOTER = struct.Struct('<QI4s')
+
+
+class ReplayError(Exception):
+    """
+    A recording that is malformed or does not match the game it replays.
+    """
+    pass
+
+
+def stateChecksum(state):
+    """
+    The 16-bit checksum recorded after each move.
+    """
+    return state.data._zobristKey & 0xFFFF
+
+
+def snapshotState(state):
+    """
+    Serializes a GameState for a checkpoint, leaving out the layout.
+    """
+    data = state.data.deepCopy()
+    data.layout = None
+    data._foodPositions = None
+    return pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+
+def restoreState(snapshot, layout):
+    """
+    Rebuilds the GameState saved by snapshotState on the given layout.
+    """
+    from pacman import GameState
+    state = GameState()
+    state.data = pickle.loads(snapshot)
+    state.data.layout = layout
+    state.data.getFoodPositions()
+    return state
+
+
+class ReplayWriter:
+    """
+    Streams a game to a recording, one move at a time, as it is played.
+    """
+
+    def __init__(self, path, layout, numAgents, seed=None, embedLayout=True,
+                 checkpointInterval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.file = open(path, 'wb')
+        self.numMoves = 0
+        self.checkpointInterval = checkpointInterval
+        self.checkpoints = []
+        flags = 0
+        if embedLayout:
+            flags |= FLAG_LAYOUT_TEXT
+        if seed is not None:
+            flags |= FLAG_SEED
+        self.file.write(_HEADER.pack(MAGIC, VERSION, flags, bytes.fromhex(layout.contentHash),
+                                     seed or 0, numAgents))
+        if embedLayout:
+            text = '\n'.join(layout.layoutText).encode('utf-8')
+            self.file.write(_TEXT_LENGTH.pack(len(text)))
+            self.file.write(text)
+
+    def record(self, agentIndex, action, state):
+        """
+        Records that agentIndex took action, producing state.
+        """
+        self.file.write(_MOVE.pack(Actions.directionToCode(action), stateChecksum(state)))
+        self.numMoves += 1
+        if self.checkpointInterval > 0 and self.numMoves % self.checkpointInterval == 0:
+            self.checkpoint(state)
+
+    def checkpoint(self, state):
+        """
+        Saves state, the state after the moves recorded so far.
+        """
+        snapshot = snapshotState(state)
+        self.checkpoints.append((self.numMoves, self.file.tell()))
+        self.file.write(_CHECKPOINT.pack(TAG_CHECKPOINT, self.numMoves, len(snapshot)))
+        self.file.write(snapshot)
+
+    def close(self):
+        indexOffset = self.file.tell()
+        self.file.write(bytes([TAG_INDEX]))
+        for moveNumber, offset in self.checkpoints:
+            self.file.write(_INDEX_ENTRY.pack(moveNumber, offset))
+        self.file.write(_FOOTER.pack(indexOffset, len(self.checkpoints), INDEX_MAGIC))
+        self.file.close()
+
+
+class ReplayReader:
+    """
+    Reads a recording's header up front and streams its moves on demand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        header = self.file.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:4] != MAGIC:
+            self.file.close()
+            raise ReplayError('%s is not a Pacman recording' % path)
+        magic, version, flags, digest, seed, numAgents = _HEADER.unpack(header)
+        if version not in (1, VERSION):
+            self.file.close()
+            raise ReplayError('%s has unsupported recording version %d' % (path, version))
+        self.layoutHash = digest.hex()
+        self.seed = seed if flags & FLAG_SEED else None
+        self.numAgents = numAgents
+        self.layoutText = None
+        if flags & FLAG_LAYOUT_TEXT:
+            length, = _TEXT_LENGTH.unpack(self.file.read(_TEXT_LENGTH.size))
+            self.layoutText = self.file.read(length).decode('utf-8').split('\n')
+        self.movesOffset = self.file.tell()
+
+    def getLayout(self):
+        import layout
+        if self.layoutText is not None:
+            lay = layout.internLayout(self.layoutText)
+        else:
+            lay = layout.findLayoutByHash(self.layoutHash)
+        if lay == None or lay.contentHash != self.layoutHash:
+            raise ReplayError('The layout of %s cannot be found' % self.path)
+        return lay
+
+    def moves(self, offset=None, moveNumber=0):
+        """
+        Yields (agentIndex, action, checksum) for every recorded move, or for
+        the moves after moveNumber when starting from a checkpoint's offset.
+        """
+        if offset is None:
+            offset = self.movesOffset
+        self.file.seek(offset)
+        read = self.file.read
+        unpack = _MOVE.unpack
+        numAgents = self.numAgents
+        agentIndex = moveNumber % numAgents
+        while True:
+            chunk = read(_MOVE.size)
+            if not chunk or chunk[0] == TAG_INDEX:
+                return
+            if chunk[0] == TAG_CHECKPOINT:
+                chunk += read(_CHECKPOINT.size - _MOVE.size)
+                tag, number, length = _CHECKPOINT.unpack(chunk)
+                self.file.seek(length, 1)
+                continue
+            if len(chunk) < _MOVE.size:
+                raise ReplayError('%s ends in the middle of a move' % self.path)
+            code, checksum = unpack(chunk)
+            if code >= len(Directions.NAMES):
+                raise ReplayError('%s has an unknown move code %d' % (self.path, code))
+            yield agentIndex, Actions.codeToDirection(code), checksum
+            agentIndex = (agentIndex + 1) % numAgents
+
+    def checkpoints(self):
+        """
+        Returns the (move number, offset) of every checkpoint, from the
+        index, or by scanning the records when the index is missing.
+        """
+        self.file.seek(0, 2)
+        end = self.file.tell()
+        if end - self.movesOffset >= _FOOTER.size:
+            self.file.seek(end - _FOOTER.size)
+            indexOffset, count, magic = _FOOTER.unpack(self.file.read(_FOOTER.size))
+            if magic == INDEX_MAGIC:
+                self.file.seek(indexOffset + 1)
+                return [_INDEX_ENTRY.unpack(self.file.read(_INDEX_ENTRY.size))
+                        for i in range(count)]
+        checkpoints = []
+        self.file.seek(self.movesOffset)
+        while True:
+            offset = self.file.tell()
+            chunk = self.file.read(_MOVE.size)
+            if len(chunk) < _MOVE.size or chunk[0] == TAG_INDEX:
+                return checkpoints
+            if chunk[0] == TAG_CHECKPOINT:
+                chunk += self.file.read(_CHECKPOINT.size - _MOVE.size)
+                tag, number, length = _CHECKPOINT.unpack(chunk)
+                checkpoints.append((number, offset))
+                self.file.seek(length, 1)
+
+    def readCheckpoint(self, offset, layout):
+        """
+        Returns (moveNumber, state, offset of the next record) for the
+        checkpoint at offset.
+        """
+        self.file.seek(offset)
+        tag, moveNumber, length = _CHECKPOINT.unpack(self.file.read(_CHECKPOINT.size))
+        if tag != TAG_CHECKPOINT:
+            raise ReplayError('%s has no checkpoint at offset %d' % (self.path, offset))
+        state = restoreState(self.file.read(length), layout)
+        return moveNumber, state, self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def isRecording(path):
+    f = open(path, 'rb')
+    try:
+        return f.read(len(MAGIC)) == MAGIC
+    finally:
+        f.close()
+
+
+def playRecording(path, display=None, startMove=0):
+    """
+    Replays a recording, checking every move against its checksum, and
+    returns the final GameState.
+
+    With startMove, the replay starts from the last checkpoint at or before
+    that move and only hands states to the display from startMove on.
+    Until then, and throughout when there is no display, moves are applied
+    in place to a single state, which is as fast as replaying gets.
+    """
+    from pacman import ClassicGameRules
+    reader = ReplayReader(path)
+    try:
+        rules = ClassicGameRules()
+        lay = reader.getLayout()
+        game = rules.newGame(lay, None, [None] * (reader.numAgents - 1),
+                             display, quiet=display is None)
+        state = game.state
+        moveNumber, offset = 0, None
+        if startMove > 0:
+            checkpoints = [c for c in reader.checkpoints() if c[0] <= startMove]
+            if checkpoints:
+                moveNumber, state, offset = reader.readCheckpoint(checkpoints[-1][1], lay)
+                game.state = state
+        displaying = display is not None and moveNumber >= startMove
+        if displaying:
+            display.initialize(state.data)
+        for agentIndex, action, checksum in reader.moves(offset, moveNumber):
+            if game.gameOver:
+                raise ReplayError('%s continues after the game ended' % path)
+            try:
+                if displaying:
+                    state = state.generateSuccessor(agentIndex, action)
+                else:
+                    state.applyMove(agentIndex, action)
+            except Exception:
+                raise ReplayError('%s has an illegal move at move %d' % (path, moveNumber))
+            if stateChecksum(state) != checksum:
+                raise ReplayError('%s diverges from the rules at move %d' % (path, moveNumber))
+            moveNumber += 1
+            if displaying:
+                display.update(state.data)
+            elif display is not None and moveNumber >= startMove:
+                displaying = True
+                display.initialize(state.data)
+            rules.process(state, game)
+        if display is not None:
+            if not displaying:
+                display.initialize(state.data)
+            display.finish()
+        return state
+    finally:
+        reader.close()
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:]
+    if not paths:
+        print('USAGE:      python gameReplay.py RECORDING...')
+        sys.exit(2)
+    failures = 0
+    startTime = time.time()
+    for path in paths:
+        try:
+            playRecording(path)
+        except ReplayError as error:
+            failures += 1
+            print(error)
+    elapsed = max(time.time() - startTime, 1e-9)
+    print('Replayed %d recordings (%d failed), %.1f games/second' % (
+        len(paths), failures, len(paths) / elapsed))
+    sys.exit(int(failures > 0))
@@ -0,0 +1,132 @@
+# gameResults.py
+# --------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Compact per-game results and a streaming sink for them.
+
+runGames feeds every finished game to a ResultsSink, which writes one
+record per game (JSON lines, or CSV when the file name ends in .csv) as
+soon as the game ends and keeps running aggregates, so long batches need
+neither the Game objects nor the end of the batch to be inspected.
+"""
+import csv
+import json
+import math
+import sys
+
+
+class GameResult:
+    """
+    The compact outcome of a single game.
+    """
+    __slots__ = ('index', 'seed', 'score', 'win', 'numMoves', 'time',
+                 'crashed', 'timedOut')
+
+    FIELDS = __slots__
+
+    def __init__(self, index, seed, score, win, numMoves, time, crashed, timedOut):
+        self.index = index
+        self.seed = seed
+        self.score = score
+        self.win = win
+        self.numMoves = numMoves
+        self.time = time
+        self.crashed = crashed
+        self.timedOut = timedOut
+
+    def fromGame(game, index=0, seed=None, time=0.0):
+        state = game.state
+        return GameResult(index, seed, state.getScore(), state.isWin(),
+                          game.numMoves, time, game.agentCrashed,
+                          game.agentTimeout)
+    fromGame = staticmethod(fromGame)
+
+    def asDict(self):
+        return dict([(field, getattr(self, field)) for field in GameResult.FIELDS])
+
+    def __repr__(self):
+        return 'GameResult(%d, score=%s, win=%s)' % (self.index, self.score, self.win)
+
+
+class ResultsSink:
+    """
+    Receives GameResults as games finish, writes them out one record at a
+    time and keeps running statistics of the scores and wins.
+    """
+
+    def __init__(self, path=None, reportEvery=0, out=sys.stdout):
+        self.path = path
+        self.reportEvery = reportEvery
+        self.out = out
+        self.numGames = 0
+        self.numWins = 0
+        self.numCrashes = 0
+        self.meanScore = 0.0
+        self._sumSquares = 0.0
+        self._file = None
+        self._writer = None
+        if path is not None:
+            self._file = open(path, 'w', newline='')
+            if path.endswith('.csv'):
+                self._writer = csv.DictWriter(self._file, GameResult.FIELDS)
+                self._writer.writeheader()
+
+    def add(self, result):
+        # Welford's update keeps the variance numerically stable
+        self.numGames += 1
+        self.numWins += int(result.win)
+        self.numCrashes += int(result.crashed)
+        delta = result.score - self.meanScore
+        self.meanScore += delta / self.numGames
+        self._sumSquares += delta * (result.score - self.meanScore)
+
+        if self._writer is not None:
+            self._writer.writerow(result.asDict())
+            self._file.flush()
+        elif self._file is not None:
+            self._file.write(json.dumps(result.asDict()) + '\n')
+            self._file.flush()
+        if self.reportEvery > 0 and self.numGames % self.reportEvery == 0:
+            print(self.summary(), file=self.out)
+
+    def winRate(self):
+        if self.numGames == 0:
+            return 0.0
+        return self.numWins / float(self.numGames)
+
+    def scoreStdDev(self):
+        if self.numGames < 2:
+            return 0.0
+        return math.sqrt(self._sumSquares / (self.numGames - 1))
+
+    def confidenceInterval(self, z=1.96):
+        """
+        Returns the (low, high) normal-approximation confidence interval of
+        the mean score; z=1.96 gives 95%.
+        """
+        if self.numGames == 0:
+            return (0.0, 0.0)
+        halfWidth = z * self.scoreStdDev() / math.sqrt(self.numGames)
+        return (self.meanScore - halfWidth, self.meanScore + halfWidth)
+
+    def summary(self):
+        low, high = self.confidenceInterval()
+        return 'Games: %d  Mean score: %.2f (95%% CI %.2f to %.2f)  Win rate: %.3f  Crashes: %d' % (
+            self.numGames, self.meanScore, low, high, self.winRate(), self.numCrashes)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
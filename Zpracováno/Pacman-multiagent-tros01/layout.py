@@ -13,58 +13,154 @@
 
 
 from util import manhattanDistance
+from util import nearestPoint
 from game import Grid
+from game import BitGrid
 import os
+import sys
 import random
-from functools import reduce
+import hashlib
+from array import array
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except:
+    _NUMPY_ENABLED = False
 
 VISIBILITY_MATRIX_CACHE = {}
+LAYOUT_CACHE = {}
+WALLS_ARRAY_CACHE = {}
+MAZE_DISTANCES_CACHE = {}
+
+# Where MazeDistances keeps its matrices between runs
+MAZE_DISTANCES_DIR = os.environ.get('PACMAN_CACHE_DIR',
+                                    os.path.join(os.path.expanduser('~'), '.cache', 'pacman'))
 
 
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    Layouts are immutable once built: every GameState, and every copy of
+    one, shares the same Layout by reference, so the walls Grid is made
+    read-only and the food Grid must be treated as read-only too.  Use
+    internLayout to get the single shared instance for a given layout text.
     """
 
     def __init__(self, layoutText):
+        layoutText = tuple(layoutText)
         self.width = len(layoutText[0])
         self.height = len(layoutText)
         self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
         self.processLayoutText(layoutText)
+        self.walls.makeReadOnly()
+        self.capsules = tuple(self.capsules)
         self.layoutText = layoutText
-        self.totalFood = len(self.food.asList())
-        # self.initializeVisibilityMatrix()
+        self.contentHash = layoutHash(layoutText)
+        self.totalFood = self.food.count()
+        self.initializeVisibilityMatrix()
+        self.initializeLegalActionTables()
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen', False):
+            raise AttributeError('Layouts are shared between game states and cannot be modified')
+        self.__dict__[name] = value
 
     def getNumGhosts(self):
         return self.numGhosts
 
     def initializeVisibilityMatrix(self):
+        """
+        Builds the line-of-sight index used by isVisibleFrom.
+
+        visibility[x][y] maps each direction to a bitset of the positions,
+        whole and half cells, seen looking that way from the open cell (x,y)
+        up to the first wall.  Position (px,py) is bit 2px * 2height + 2py.
+        The index is shared by every layout with the same text.
+        """
         global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
-            from game import Directions
-            vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH,
-                    Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH: set(), Directions.SOUTH: set(
-            ), Directions.EAST: set(), Directions.WEST: set(), Directions.STOP: set()})
+        if self.contentHash not in VISIBILITY_MATRIX_CACHE:
+            from game import Actions, Directions
+            doubleHeight = 2 * self.height
+            vis = Grid(self.width, self.height, False)
             for x in range(self.width):
                 for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)]:
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(
-                str.__add__, self.layoutText)]
+                    if self.walls[x][y]:
+                        continue
+                    rays = {Directions.STOP: 0}
+                    for direction, (dx, dy) in Actions._directionsAsList:
+                        if direction == Directions.STOP:
+                            continue
+                        # Walk in half steps, in doubled coordinates
+                        bits = 0
+                        px, py = 2 * x + dx, 2 * y + dy
+                        while 0 <= px < 2 * self.width and 0 <= py < doubleHeight:
+                            if px % 2 == 0 and py % 2 == 0 and self.walls[px // 2][py // 2]:
+                                break
+                            bits |= 1 << (px * doubleHeight + py)
+                            px, py = px + dx, py + dy
+                        rays[direction] = bits
+                    vis[x][y] = rays
+            VISIBILITY_MATRIX_CACHE[self.contentHash] = vis
+        self.visibility = VISIBILITY_MATRIX_CACHE[self.contentHash]
+
+    def initializeLegalActionTables(self):
+        """
+        Precomputes the legal moves from every open cell whose neighbours are
+        all on the board.
+
+        legalPacmanActions maps a cell to the tuple of actions
+        Actions.getPossibleActions would return there, and legalGhostActions
+        maps a cell to a dict from the ghost's current direction to its legal
+        actions (no stopping, no reversing unless at a dead end).  Positions
+        that are not in the tables, such as ghosts caught between cells, are
+        left to the rules' explicit fallback.
+        """
+        from game import Actions, Directions
+        self.legalPacmanActions = {}
+        self.legalGhostActions = {}
+        for x in range(1, self.width - 1):
+            for y in range(1, self.height - 1):
+                if self.walls[x][y]:
+                    continue
+                possible = tuple([direction for direction, (dx, dy) in Actions._directionsAsList
+                                  if not self.walls[x + dx][y + dy]])
+                self.legalPacmanActions[(x, y)] = possible
+                ghostActions = {}
+                for current in Directions.REVERSE:
+                    actions = [a for a in possible if a != Directions.STOP]
+                    reverse = Directions.REVERSE[current]
+                    if reverse in actions and len(actions) > 1:
+                        actions.remove(reverse)
+                    ghostActions[current] = tuple(actions)
+                self.legalGhostActions[(x, y)] = ghostActions
+
+    def getWallsArray(self):
+        """
+        Returns the walls as a read-only (width, height) float32 NumPy array,
+        built once per layout and shared by every state on it.
+        """
+        if self.contentHash not in WALLS_ARRAY_CACHE:
+            if not _NUMPY_ENABLED:
+                raise Exception('Layout arrays need numpy')
+            walls = numpy.array(self.walls.data, numpy.float32)
+            walls.setflags(write=False)
+            WALLS_ARRAY_CACHE[self.contentHash] = walls
+        return WALLS_ARRAY_CACHE[self.contentHash]
+
+    def getMazeDistances(self):
+        """
+        Returns the MazeDistances of this layout, shared by every state on it.
+        """
+        if self.contentHash not in MAZE_DISTANCES_CACHE:
+            MAZE_DISTANCES_CACHE[self.contentHash] = MazeDistances(self)
+        return MAZE_DISTANCES_CACHE[self.contentHash]
 
     def isWall(self, pos):
         x, col = pos
@@ -91,13 +187,22 @@ class Layout:
 
     def isVisibleFrom(self, ghostPos, pacPos, pacDirection):
         row, col = [int(x) for x in pacPos]
-        return ghostPos in self.visibility[row][col][pacDirection]
+        px, py = 2 * ghostPos[0], 2 * ghostPos[1]
+        if px != int(px) or py != int(py):
+            return False
+        px, py = int(px), int(py)
+        if not (0 <= px < 2 * self.width and 0 <= py < 2 * self.height):
+            return False
+        return (self.visibility[row][col][pacDirection] >> (px * 2 * self.height + py)) & 1 == 1
 
     def __str__(self):
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        """
+        Layouts are immutable, so copies share the original.
+        """
+        return self
 
     def processLayoutText(self, layoutText):
         """
@@ -118,7 +223,7 @@ class Layout:
                 layoutChar = layoutText[maxY - y][x]
                 self.processLayoutChar(x, y, layoutChar)
         self.agentPositions.sort()
-        self.agentPositions = [(i == 0, pos) for i, pos in self.agentPositions]
+        self.agentPositions = tuple([(i == 0, pos) for i, pos in self.agentPositions])
 
     def processLayoutChar(self, x, y, layoutChar):
         if layoutChar == '%':
@@ -137,6 +242,166 @@ class Layout:
             self.numGhosts += 1
 
 
+class MazeDistances:
+    """
+    Exact shortest-path distances through the maze between every pair of
+    open cells, answered in O(1).
+
+    The matrix is computed with a breadth-first search from every open cell
+    the first time a layout is used, and is stored as uint16 in
+    MAZE_DISTANCES_DIR under the layout's content hash.  Later runs map that
+    file into memory (with numpy) or read it (without), instead of searching
+    again.  Positions between cells, like those of scared ghosts, are
+    rounded with nearestPoint.
+    """
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, layout, cacheDir=None):
+        walls = layout.walls
+        self.cells = [(x, y) for x in range(layout.width) for y in range(layout.height)
+                      if not walls[x][y]]
+        self.index = dict([(cell, i) for i, cell in enumerate(self.cells)])
+        self.numCells = len(self.cells)
+        if cacheDir == None:
+            cacheDir = MAZE_DISTANCES_DIR
+        self.path = os.path.join(cacheDir, '%s-%d.u16' % (layout.contentHash, self.numCells))
+        self.matrix = self._load()
+        if self.matrix is None:
+            self.matrix = self._compute()
+            self._save()
+            loaded = self._load()
+            if loaded is not None:
+                self.matrix = loaded
+
+    def getDistance(self, pos1, pos2):
+        """
+        Returns the number of moves between two positions, or None if one
+        cannot be reached from the other.
+        """
+        distance = self.matrix[self._cellIndex(pos1) * self.numCells + self._cellIndex(pos2)]
+        if distance == MazeDistances.UNREACHABLE:
+            return None
+        return int(distance)
+
+    def getDistancesFrom(self, pos):
+        """
+        Returns the distances from pos to every cell in self.cells.
+        """
+        start = self._cellIndex(pos) * self.numCells
+        return self.matrix[start:start + self.numCells]
+
+    def _cellIndex(self, pos):
+        cell = self.index.get(pos)
+        if cell == None:
+            cell = self.index.get(nearestPoint(pos))
+            if cell == None:
+                raise Exception('%s is not an open cell of the layout' % str(pos))
+        return cell
+
+    def _compute(self):
+        n = self.numCells
+        index = self.index
+        neighbours = []
+        for x, y in self.cells:
+            neighbours.append([index[cell] for cell in [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+                               if cell in index])
+        matrix = array('H', [MazeDistances.UNREACHABLE]) * (n * n)
+        for source in range(n):
+            row = source * n
+            matrix[row + source] = 0
+            seen = bytearray(n)
+            seen[source] = 1
+            frontier = [source]
+            distance = 0
+            while frontier:
+                distance += 1
+                nextFrontier = []
+                for cell in frontier:
+                    for neighbour in neighbours[cell]:
+                        if not seen[neighbour]:
+                            seen[neighbour] = 1
+                            matrix[row + neighbour] = distance
+                            nextFrontier.append(neighbour)
+                frontier = nextFrontier
+        return matrix
+
+    def _load(self):
+        size = self.numCells * self.numCells
+        try:
+            if os.path.getsize(self.path) != 2 * size:
+                return None
+            if _NUMPY_ENABLED:
+                return numpy.memmap(self.path, dtype='<u2', mode='r', shape=(size,))
+            matrix = array('H')
+            f = open(self.path, 'rb')
+            try:
+                matrix.fromfile(f, size)
+            finally:
+                f.close()
+            if sys.byteorder == 'big':
+                matrix.byteswap()
+            return matrix
+        except (OSError, EOFError):
+            return None
+
+    def _save(self):
+        # Written under a temporary name and renamed, so concurrent runs never
+        # see a partial file; a read-only cache directory just means no cache.
+        matrix = self.matrix
+        if sys.byteorder == 'big':
+            matrix = array('H', matrix)
+            matrix.byteswap()
+        temporary = '%s.%d.tmp' % (self.path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            f = open(temporary, 'wb')
+            try:
+                matrix.tofile(f)
+            finally:
+                f.close()
+            os.replace(temporary, self.path)
+        except OSError:
+            pass
+
+
+def layoutHash(layoutText):
+    """
+    Returns a content hash identifying the given layout text.
+    """
+    return hashlib.sha1('\n'.join(layoutText).encode('utf-8')).hexdigest()
+
+
+def internLayout(layoutText):
+    """
+    Returns the shared Layout for the given text, parsing it only the first
+    time that text is seen.
+    """
+    key = layoutHash(layoutText)
+    if key not in LAYOUT_CACHE:
+        LAYOUT_CACHE[key] = Layout(layoutText)
+    return LAYOUT_CACHE[key]
+
+
+def findLayoutByHash(contentHash):
+    """
+    Returns the Layout with the given content hash: one already loaded, or
+    else one of the files in the layouts directory.  Returns None if there
+    is no such layout.
+    """
+    if contentHash in LAYOUT_CACHE:
+        return LAYOUT_CACHE[contentHash]
+    for directory in ['layouts', os.path.join('..', 'layouts')]:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.lay'):
+                tryToLoad(os.path.join(directory, name))
+                if contentHash in LAYOUT_CACHE:
+                    return LAYOUT_CACHE[contentHash]
+    return None
+
+
 def getLayout(name, back=2):
     if name.endswith('.lay'):
         layout = tryToLoad('layouts/' + name)
@@ -159,6 +424,6 @@ def tryToLoad(fullname):
         return None
     f = open(fullname)
     try:
-        return Layout([line.strip() for line in f])
+        return internLayout([line.strip() for line in f])
     finally:
         f.close()
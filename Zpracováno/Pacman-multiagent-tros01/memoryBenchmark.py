@@ -0,0 +1,88 @@
+# memoryBenchmark.py
+# ------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Measures how much memory each retained GameState costs, the way a search
+tree or transposition table holds on to them.
+
+States are generated by random play: every successor of every visited
+state is kept alive, and the bytes allocated per kept state are reported.
+
+  python memoryBenchmark.py -l mediumClassic -n 20000
+"""
+import random
+import sys
+import tracemalloc
+import layout
+from pacman import GameState
+
+
+def retainStates(lay, numStates, numGhosts):
+    """
+    Returns numStates GameStates reached by random play on the layout.
+    """
+    initial = GameState()
+    initial.initialize(lay, numGhosts)
+    retained = []
+    state = initial
+    agentIndex = 0
+    while len(retained) < numStates:
+        if state.isWin() or state.isLose():
+            state, agentIndex = initial, 0
+        successors = [state.generateSuccessor(agentIndex, action)
+                      for action in state.getLegalActions(agentIndex)]
+        retained.extend(successors)
+        state = random.choice(successors)
+        agentIndex = (agentIndex + 1) % state.getNumAgents()
+    return retained[:numStates]
+
+
+def measure(lay, numStates, numGhosts):
+    """
+    Returns the number of bytes allocated per retained GameState.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    retained = retainStates(lay, numStates, numGhosts)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum([stat.size_diff for stat in after.compare_to(before, 'filename')])
+    return allocated / float(len(retained))
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE:      python memoryBenchmark.py <options>')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the LAYOUT_FILE to play on [Default: %default]')
+    parser.add_option('-n', '--numStates', dest='numStates', type='int', default=20000,
+                      help='the number of states to retain [Default: %default]')
+    parser.add_option('-k', '--numghosts', dest='numGhosts', type='int', default=2,
+                      help='the maximum number of ghosts [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    lay = layout.getLayout(options.layout)
+    if lay == None:
+        raise Exception("The layout " + options.layout + " cannot be found")
+    random.seed('cs188')
+    bytesPerState = measure(lay, options.numStates, options.numGhosts)
+    print('Layout:            %s' % options.layout)
+    print('Retained states:   %d' % options.numStates)
+    print('Bytes per state:   %.1f' % bytesPerState)
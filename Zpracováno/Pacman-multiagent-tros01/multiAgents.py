@@ -14,10 +14,12 @@
 
 from util import manhattanDistance
 from game import Directions
-import random, util
+import random, util, time, math
+import searchTables
 
 from game import Agent
 from pacman import GameState
+import pacman
 
 class ReflexAgent(Agent):
     """
@@ -227,6 +229,51 @@ def scoreEvaluationFunction(currentGameState: GameState):
     (not reflex agents).
     """
     return currentGameState.getScore()
+
+def scoreEvaluationBounds(state, agentIndex, plies):
+    """
+    Bounds on the score of any state reached from state in plies moves,
+    agentIndex moving first, from the score changes the rules allow: -1
+    for each Pacman move, +10 per pellet and +500 for the last one, +200
+    for each scared ghost caught and -500 for each ghost catching Pacman.
+    """
+    if not hasattr(state, 'getPacmanPosition'):
+        return -float('inf'), float('inf')
+    score = state.getScore()
+    numAgents = state.getNumAgents()
+    pacmanMoves = len([i for i in range(plies) if (agentIndex + i) % numAgents == 0])
+    low, high = score - pacmanMoves, score
+    numFood = state.getNumFood()
+    high += 10 * min(pacmanMoves, numFood)
+    if 0 < numFood <= pacmanMoves:
+        high += 500
+
+    # Ghosts can only be caught while scared; once caught, a ghost starts
+    # over, not scared, until Pacman eats another capsule
+    pacmanPosition = state.getPacmanPosition()
+    reach = plies + pacman.COLLISION_TOLERANCE
+    capsules = [c for c in state.getCapsules() if manhattanDistance(pacmanPosition, c) <= pacmanMoves]
+    nearby = [ghost for ghost in state.getGhostStates()
+              if manhattanDistance(pacmanPosition, ghost.getPosition()) <= reach]
+    if capsules:
+        catches = (numAgents - 1) * (1 + len(capsules))
+    else:
+        catches = len([ghost for ghost in nearby if ghost.scaredTimer > 0])
+    high += 200 * min(catches, plies * (numAgents - 1))
+    if catches:
+        killers = numAgents - 1
+    else:
+        killers = len(nearby)
+    low -= 500 * killers
+    return low, high
+scoreEvaluationFunction.bounds = scoreEvaluationBounds
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when its time budget has run out.
+    """
+    pass
+
 ######  ABSTRACT CLASS OF MULTIAGENTSEARCH AGENT
 class MultiAgentSearchAgent(Agent):
     """
@@ -243,10 +290,195 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    # Iterative deepening (-a budget=...): the budget when budget=auto is
+    # used outside of a game, the share of the rules' per-move time limit
+    # spent otherwise, the deepest iteration tried and the table size used
+    # when no tt is given
+    DEFAULT_BUDGET = 1.0
+    BUDGET_FRACTION = 0.5
+    MAX_ITERATIVE_DEPTH = 64
+    ITERATIVE_TABLE_SIZE = '16MB'
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', tt = None, budget = None, ordering = None):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        # Per-move time budget in seconds, or 'auto' to derive it from the
+        # rules; with a budget, agents that support it deepen iteratively
+        # and depth is ignored
+        self.budget = budget
+        if budget != None and budget != 'auto':
+            self.budget = float(budget)
+        self.moveTimeLimits = None
+        self.rootState = None
+        self.rootAction = None
+        self.completedDepth = 0
+        # Optional transposition table shared by all searches, e.g. -a tt=64MB
+        if tt == None and budget != None:
+            tt = MultiAgentSearchAgent.ITERATIVE_TABLE_SIZE
+        self.transpositionTable = None
+        if tt != None:
+            self.transpositionTable = searchTables.TranspositionTable(searchTables.parseSize(tt))
+        # Optional move ordering for the pruning searches, e.g.
+        # -a ordering=all or -a ordering=killers+history
+        self.moveOrdering = None
+        if ordering != None:
+            self.moveOrdering = searchTables.MoveOrdering.parse(ordering)
+
+    def evaluationBounds(self, state, agentIndex, plies):
+        """
+        Returns (low, high) bounds on the evaluation of every state reached
+        from state in plies moves, agentIndex moving first.
+
+        An evaluation function declares its bounds with a bounds attribute:
+        either a (low, high) pair that holds for every state, or a function
+        taking (state, agentIndex, plies).  Without one the bounds are
+        infinite.  Pruning searches trust the bounds, so they must hold.
+        """
+        bounds = getattr(self.evaluationFunction, 'bounds', None)
+        if bounds == None:
+            return -float('inf'), float('inf')
+        if callable(bounds):
+            return bounds(state, agentIndex, plies)
+        return bounds
+
+    def setMoveTimeLimits(self, warningTime, timeout):
+        """
+        Called by Game with the rules' per-move time limits for this agent.
+        """
+        self.moveTimeLimits = (warningTime, timeout)
+
+    def moveBudget(self):
+        """
+        Returns the time, in seconds, an iteratively deepening search may
+        spend on one move.
+        """
+        if self.budget != 'auto':
+            return self.budget
+        if self.moveTimeLimits == None:
+            return MultiAgentSearchAgent.DEFAULT_BUDGET
+        return min(self.moveTimeLimits) * MultiAgentSearchAgent.BUDGET_FRACTION
+
+    def isDeepening(self):
+        """
+        True when getAction should hand over to iterativeDeepening.
+        """
+        return self.budget != None and self.rootState is None
+
+    def iterativeDeepening(self, gameState, search):
+        """
+        Calls search(gameState) with self.depth set to 1, 2, 3, ... until the
+        move's time budget runs out, and returns the action found by the
+        deepest search that completed.  The first search always completes.
+
+        A search is stopped by SearchTimeout, raised from the evaluation
+        function at the first leaf evaluated after the deadline.  Each
+        search looks first at the moves the previous one found best (see
+        orderMoves).  Deepening also stops once a search reaches no depth
+        cutoff, as searching deeper would only repeat it.
+        """
+        deadline = time.time() + self.moveBudget()
+        fixedDepth, evaluate = self.depth, self.evaluationFunction
+
+        def timedEvaluation(state):
+            if self.depth > 1 and time.time() > deadline:
+                raise SearchTimeout()
+            if not (state.isWin() or state.isLose()):
+                self.searchCutoff = True
+            return evaluate(state)
+
+        timedEvaluation.bounds = getattr(evaluate, 'bounds', None)
+        self.evaluationFunction = timedEvaluation
+        self.rootState, self.rootAction = gameState, None
+        self.completedDepth = 0
+        action = None
+        try:
+            for depth in range(1, MultiAgentSearchAgent.MAX_ITERATIVE_DEPTH + 1):
+                self.depth = depth
+                self.searchCutoff = False
+                try:
+                    action = search(gameState)
+                except SearchTimeout:
+                    break
+                self.rootAction = action
+                self.completedDepth = depth
+                if not self.searchCutoff:
+                    break
+        finally:
+            self.depth, self.evaluationFunction = fixedDepth, evaluate
+            self.rootState = None
+        return action
+
+    def orderMoves(self, state, agentIndex, legalMoves, key=None, depth=None):
+        """
+        Returns legalMoves in the order a pruning search should try them,
+        depth plies below the root (None at the root itself).
+
+        The best move found by the previous iteration (at the root) or
+        stored in the transposition table for key comes first.  Below the
+        root, the moveOrdering, if any, ranks the rest; the root keeps the
+        order of getLegalActions, so that equally good moves are chosen
+        just as without ordering.
+        """
+        if state is self.rootState:
+            first = self.rootAction
+        elif key != None:
+            first = self.transpositionTable.bestAction(key)
+        else:
+            first = None
+        if self.moveOrdering != None and depth != None:
+            return self.moveOrdering.order(state, agentIndex, depth, legalMoves, first)
+        if first == None or first not in legalMoves or legalMoves[0] == first:
+            return legalMoves
+        return [first] + [action for action in legalMoves if action != first]
+
+    def recordCutoff(self, state, agentIndex, depth, action):
+        """
+        Called by a pruning search when action caused a cutoff at depth.
+        """
+        if self.moveOrdering != None:
+            self.moveOrdering.recordCutoff(state, agentIndex, depth, action, self.depth - depth)
+
+    def startSearch(self):
+        """
+        Called at the start of every getAction.
+        """
+        if self.transpositionTable != None:
+            self.transpositionTable.newSearch()
+        if self.moveOrdering != None:
+            self.moveOrdering.newSearch()
+
+    def transpositionKey(self, state, agentIndex):
+        """
+        Returns the transposition table key of the state, or None when there
+        is no table or the state cannot be stored in one.
+        """
+        if self.transpositionTable == None:
+            return None
+        return searchTables.stateKey(state, agentIndex)
+
+    def lookupTransposition(self, key, depth):
+        """
+        Returns (flag, value) stored for key at depth (plies of self.depth
+        already searched), or None.
+        """
+        if key == None:
+            return None
+        return self.transpositionTable.lookup(key, self.depth - depth)
+
+    def storeTransposition(self, key, depth, value, alpha=None, beta=None, action=None):
+        """
+        Stores value for key at depth and returns it.  When the search had
+        the window (alpha, beta), a value outside it is stored as a bound.
+        """
+        if key != None:
+            flag = searchTables.EXACT
+            if alpha != None and value <= alpha:
+                flag = searchTables.UPPER_BOUND
+            elif beta != None and value >= beta:
+                flag = searchTables.LOWER_BOUND
+            self.transpositionTable.store(key, self.depth - depth, flag, value, action)
+        return value
 
 ###  QUESTION 2  ###
 class MinimaxAgent(MultiAgentSearchAgent):
@@ -287,6 +519,12 @@ class MinimaxAgent(MultiAgentSearchAgent):
             if state.isWin() or state.isLose() or depth == self.depth:
                 return self.evaluationFunction(state)
 
+            # Transposition table (only with -a tt=...)
+            key = self.transpositionKey(state, agentIndex)
+            stored = self.lookupTransposition(key, depth)
+            if stored != None:
+                return stored[1]
+
             # 2. Příprava na další krok
             # ===================================
             # Zjistíme, kdo hraje příště
@@ -311,7 +549,7 @@ class MinimaxAgent(MultiAgentSearchAgent):
                     score = minimax(nextAgent, nextDepth, successor)
                     if score > max_score:
                         max_score = score
-                return max_score
+                return self.storeTransposition(key, depth, max_score)
             else:
                 # --- DUCHOVÉ (MINIMIZERS) ---
                 min_score = float('inf')
@@ -320,10 +558,11 @@ class MinimaxAgent(MultiAgentSearchAgent):
                     score = minimax(nextAgent, nextDepth, successor)
                     if score < min_score:
                         min_score = score
-                return min_score
+                return self.storeTransposition(key, depth, min_score)
 
         # ---- ROOT CALL ----
         # ===================================
+        self.startSearch()
         # V kořeni (Root) musíme vrátit AKCI, ne jen skóre.
         # minimax() ale vrací jen skóre, proto je první vrstva spracována "manuálně".
         
@@ -355,6 +594,8 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         Returns the minimax action using self.depth and self.evaluationFunction
         """
         "*** YOUR CODE HERE ***"
+        if self.isDeepening():
+            return self.iterativeDeepening(gameState, self.getAction)
        
         # --- REKURZIVNÍ FUNKCE ---
         def alpha_beta_search(agentIndex, depth, state, alpha, beta):
@@ -363,45 +604,67 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
             if state.isWin() or state.isLose() or depth == self.depth:
                 return self.evaluationFunction(state)
 
+            # Transposition table (only with -a tt=...): exact values, or
+            # bounds that already settle this window
+            key = self.transpositionKey(state, agentIndex)
+            stored = self.lookupTransposition(key, depth)
+            if stored != None:
+                flag, value = stored
+                if flag == searchTables.EXACT or \
+                        (flag == searchTables.LOWER_BOUND and value >= beta) or \
+                        (flag == searchTables.UPPER_BOUND and value <= alpha):
+                    return value
+            windowAlpha, windowBeta = alpha, beta
+
             # Příprava indexů (Stejné jako Q2)
             numAgents = state.getNumAgents()
             nextAgent = (agentIndex + 1) % numAgents
             nextDepth = depth + 1 if nextAgent == 0 else depth
             
-            legalMoves = state.getLegalActions(agentIndex)
+            legalMoves = self.orderMoves(state, agentIndex, state.getLegalActions(agentIndex), key, depth)
 
             # 2. Logika Agenta
             # ===================================
             if agentIndex == 0:
                 # --- MAXIMIZER (Pacman) ---
                 v = -float('inf')
+                best_action = None
                 for action in legalMoves:
                     successor = state.generateSuccessor(agentIndex, action)
-                    v = max(v, alpha_beta_search(nextAgent, nextDepth, successor, alpha, beta))
+                    score = alpha_beta_search(nextAgent, nextDepth, successor, alpha, beta)
+                    if score > v:
+                        v, best_action = score, action
                     
                     # PRUNING (Prořezání)
                     if v > beta:
-                        return v # Duch nám nedovolí víc než beta, končíme
+                        # Duch nám nedovolí víc než beta, končíme
+                        self.recordCutoff(state, agentIndex, depth, action)
+                        return self.storeTransposition(key, depth, v, windowAlpha, windowBeta, best_action)
                     
                     # Update Alpha (Pacman našel novou nejlepší spodní hranici)
                     alpha = max(alpha, v)
-                return v
+                return self.storeTransposition(key, depth, v, windowAlpha, windowBeta, best_action)
             
             else:
                 # --- MINIMIZER (Duchové) ---
                 v = float('inf')
+                best_action = None
                 for action in legalMoves:
                     successor = state.generateSuccessor(agentIndex, action)
                     # Předáváme alpha a beta dál
-                    v = min(v, alpha_beta_search(nextAgent, nextDepth, successor, alpha, beta))
+                    score = alpha_beta_search(nextAgent, nextDepth, successor, alpha, beta)
+                    if score < v:
+                        v, best_action = score, action
                     
                     # PRUNING (Prořezání)
                     if v < alpha:
-                        return v # Pacman nevybere nic horšího než alpha, končíme
+                        # Pacman nevybere nic horšího než alpha, končíme
+                        self.recordCutoff(state, agentIndex, depth, action)
+                        return self.storeTransposition(key, depth, v, windowAlpha, windowBeta, best_action)
                     
                     # Update Beta (Duch našel novou nejlepší horní hranici)
                     beta = min(beta, v)
-                return v
+                return self.storeTransposition(key, depth, v, windowAlpha, windowBeta, best_action)
 
         # --- ROOT CALL ---
         # ===================================
@@ -409,6 +672,7 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         #  - vybrat AKCI, ne jen vrátit hodnotu
         #  - aktualizovat alpha/beta i v této smyčce!
         
+        self.startSearch()
         best_score = -float('inf')
         best_action = None
         
@@ -416,7 +680,7 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         alpha = -float('inf')
         beta = float('inf')
         
-        legalMoves = gameState.getLegalActions(0)
+        legalMoves = self.orderMoves(gameState, 0, gameState.getLegalActions(0))
         
         for action in legalMoves:
             successor = gameState.generateSuccessor(0, action)
@@ -434,6 +698,105 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
             alpha = max(alpha, score)
             
         return best_action
+
+class PrincipalVariationAgent(AlphaBetaAgent):
+    """
+    Alpha-beta with principal variation search (NegaScout).
+
+    The first move at each node is searched with the full window.  Every
+    later move is first searched with a null window, which only tells
+    whether it beats the best move so far; a move that does is searched
+    again with the full window.  With a good first move most of the null
+    window searches fail and prune more than the full window would.  Under
+    iterative deepening (-a budget=...) the root is first searched with an
+    aspiration window around the previous iteration's score, and again
+    with the full window if the score falls outside it.
+
+    At a fixed depth it chooses the same action as AlphaBetaAgent.
+    """
+    # Half-width of the aspiration window, in points of score
+    ASPIRATION_WINDOW = 25.0
+
+    def getAction(self, gameState: GameState):
+        if self.isDeepening():
+            return self.iterativeDeepening(gameState, self.getAction)
+        above = lambda value: math.nextafter(value, float('inf'))
+        below = lambda value: math.nextafter(value, -float('inf'))
+
+        def pvs(agentIndex, depth, state, alpha, beta):
+            """
+            Returns (value, action) of state, searched fail-soft in the
+            window (alpha, beta).
+            """
+            if state.isWin() or state.isLose() or depth == self.depth:
+                return self.evaluationFunction(state), None
+
+            # The root, like AlphaBetaAgent's, neither uses the table nor
+            # reorders its moves, so that ties resolve the same way
+            ply = depth
+            if depth == 0 and agentIndex == 0:
+                ply = None
+            key = None
+            if ply != None:
+                key = self.transpositionKey(state, agentIndex)
+            stored = self.lookupTransposition(key, depth)
+            if stored != None:
+                flag, value = stored
+                if flag == searchTables.EXACT or \
+                        (flag == searchTables.LOWER_BOUND and value >= beta) or \
+                        (flag == searchTables.UPPER_BOUND and value <= alpha):
+                    return value, self.transpositionTable.bestAction(key)
+            windowAlpha, windowBeta = alpha, beta
+
+            nextAgent = (agentIndex + 1) % state.getNumAgents()
+            nextDepth = depth + 1 if nextAgent == 0 else depth
+            legalMoves = self.orderMoves(state, agentIndex, state.getLegalActions(agentIndex), key, ply)
+
+            if agentIndex == 0:
+                v, bestAction = -float('inf'), None
+                for i in range(len(legalMoves)):
+                    successor = state.generateSuccessor(agentIndex, legalMoves[i])
+                    if i == 0:
+                        score = pvs(nextAgent, nextDepth, successor, alpha, beta)[0]
+                    else:
+                        score = pvs(nextAgent, nextDepth, successor, alpha, above(alpha))[0]
+                        if alpha < score < beta:
+                            score = pvs(nextAgent, nextDepth, successor, alpha, beta)[0]
+                    if score > v:
+                        v, bestAction = score, legalMoves[i]
+                    if v >= beta:
+                        self.recordCutoff(state, agentIndex, depth, legalMoves[i])
+                        break
+                    alpha = max(alpha, v)
+            else:
+                v, bestAction = float('inf'), None
+                for i in range(len(legalMoves)):
+                    successor = state.generateSuccessor(agentIndex, legalMoves[i])
+                    if i == 0:
+                        score = pvs(nextAgent, nextDepth, successor, alpha, beta)[0]
+                    else:
+                        score = pvs(nextAgent, nextDepth, successor, below(beta), beta)[0]
+                        if alpha < score < beta:
+                            score = pvs(nextAgent, nextDepth, successor, alpha, beta)[0]
+                    if score < v:
+                        v, bestAction = score, legalMoves[i]
+                    if v <= alpha:
+                        self.recordCutoff(state, agentIndex, depth, legalMoves[i])
+                        break
+                    beta = min(beta, v)
+            self.storeTransposition(key, depth, v, windowAlpha, windowBeta, bestAction)
+            return v, bestAction
+
+        self.startSearch()
+        if gameState is self.rootState and self.rootAction != None:
+            low = self.searchScore - PrincipalVariationAgent.ASPIRATION_WINDOW
+            high = self.searchScore + PrincipalVariationAgent.ASPIRATION_WINDOW
+            score, action = pvs(0, 0, gameState, low, high)
+            if low < score < high:
+                self.searchScore = score
+                return action
+        self.searchScore, action = pvs(0, 0, gameState, -float('inf'), float('inf'))
+        return action
 ###  QUESTION 4  ###
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
@@ -448,6 +811,8 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         legal moves.
         """
         "*** YOUR CODE HERE ***"
+        if self.isDeepening():
+            return self.iterativeDeepening(gameState, self.getAction)
         
         
         def expectimax(agentIndex, depth, state):
@@ -456,6 +821,12 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
             if state.isWin() or state.isLose() or depth == self.depth:
                 return self.evaluationFunction(state)
 
+            # Transposition table (only with -a tt=...)
+            key = self.transpositionKey(state, agentIndex)
+            stored = self.lookupTransposition(key, depth)
+            if stored != None:
+                return stored[1]
+
             # Příprava indexů
             numAgents = state.getNumAgents()
             nextAgent = (agentIndex + 1) % numAgents
@@ -478,7 +849,7 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
                     score = expectimax(nextAgent, nextDepth, successor)
                     if score > max_score:
                         max_score = score
-                return max_score
+                return self.storeTransposition(key, depth, max_score)
             
             else:
                 # --- EXPECTATION (Duchové) ---
@@ -492,10 +863,11 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
                 
                 # Předpokládáme Uniform Distribution (všechny tahy stejně pravděpodobné)
                 average_score = total_score / len(legalMoves)
-                return average_score
+                return self.storeTransposition(key, depth, average_score)
 
         # --- ROOT CALL ---
         # ===================================
+        self.startSearch()
         best_score = -float('inf')
         best_action = None
         
@@ -509,6 +881,154 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
                 best_action = action
         
         return best_action
+
+class StarExpectimaxAgent(ExpectimaxAgent):
+    """
+    Expectimax with Ballard's Star1 and Star2 pruning of the ghosts' chance
+    nodes, for evaluation functions that declare bounds on their values
+    (see MultiAgentSearchAgent.evaluationBounds).
+
+    Star1 searches each ghost move with the window the average can still
+    use: once the moves searched so far, with the rest at the upper bound,
+    cannot reach alpha (or, with the rest at the lower bound, cannot stay
+    below beta), the rest are skipped.  Star2 first probes one Pacman reply
+    to each ghost move, whose values bound the chance node from below and
+    can cut it before any move is searched in full; the full search reuses
+    them.  Only Pacman's own moves set a finite beta for a chance node
+    when the root is searched with the full window, so Star2 comes into
+    play under the aspiration window of iterative deepening
+    (-a budget=...).
+
+    Values that fall inside a node's window are computed exactly as
+    ExpectimaxAgent computes them, so at a fixed depth it chooses the same
+    action.
+    """
+    # Half-width of the root aspiration window, in points of score
+    ASPIRATION_WINDOW = 25.0
+    # Relative slack on the chance node windows, so that rounding can
+    # never turn a move that matters into a cutoff
+    TOLERANCE = 1e-9
+
+    def getAction(self, gameState: GameState):
+        if self.isDeepening():
+            return self.iterativeDeepening(gameState, self.getAction)
+        inf = float('inf')
+
+        def slack(*terms):
+            return StarExpectimaxAgent.TOLERANCE * max([1.0] + [abs(t) for t in terms if abs(t) != inf])
+
+        def star(agentIndex, depth, state, alpha, beta, knownMove=None):
+            """
+            Returns the expectimax value of state, searched fail-soft in the
+            window (alpha, beta).  knownMove is a Pacman (action, value)
+            already found by a Star2 probe.
+            """
+            if state.isWin() or state.isLose() or depth == self.depth:
+                return self.evaluationFunction(state)
+
+            key = self.transpositionKey(state, agentIndex)
+            stored = self.lookupTransposition(key, depth)
+            if stored != None:
+                flag, value = stored
+                if flag == searchTables.EXACT or \
+                        (flag == searchTables.LOWER_BOUND and value >= beta) or \
+                        (flag == searchTables.UPPER_BOUND and value <= alpha):
+                    return value
+            windowAlpha, windowBeta = alpha, beta
+
+            numAgents = state.getNumAgents()
+            nextAgent = (agentIndex + 1) % numAgents
+            nextDepth = depth + 1 if nextAgent == 0 else depth
+            legalMoves = state.getLegalActions(agentIndex)
+            if not legalMoves:
+                return self.evaluationFunction(state)
+
+            if agentIndex == 0:
+                legalMoves = self.orderMoves(state, agentIndex, legalMoves, key, depth)
+                v, bestAction = -inf, None
+                for action in legalMoves:
+                    if knownMove != None and action == knownMove[0]:
+                        score = knownMove[1]
+                    else:
+                        score = star(nextAgent, nextDepth, state.generateSuccessor(agentIndex, action), alpha, beta)
+                    if score > v:
+                        v, bestAction = score, action
+                    if v >= beta:
+                        self.recordCutoff(state, agentIndex, depth, action)
+                        break
+                    alpha = max(alpha, v)
+                return self.storeTransposition(key, depth, v, windowAlpha, windowBeta, bestAction)
+
+            # Chance node: the moves keep the order of getLegalActions, so
+            # the average adds up exactly as in ExpectimaxAgent
+            n = len(legalMoves)
+            low, high = self.evaluationBounds(state, agentIndex, (self.depth - depth) * numAgents - agentIndex)
+            successors = [None] * n
+            probes = [None] * n
+            lowers = [low] * n
+            if beta < inf and nextAgent == 0 and nextDepth < self.depth:
+                # Star2: the value of one Pacman reply bounds each move from below
+                probed = 0.0
+                for i in range(n):
+                    successors[i] = state.generateSuccessor(agentIndex, legalMoves[i])
+                    successor = successors[i]
+                    if successor.isWin() or successor.isLose():
+                        lowers[i] = self.evaluationFunction(successor)
+                    else:
+                        reply = self.orderMoves(successor, 0, successor.getLegalActions(0),
+                                                self.transpositionKey(successor, 0), nextDepth)[0]
+                        lowers[i] = star(1, nextDepth, successor.generateSuccessor(0, reply), -inf, inf)
+                        probes[i] = (reply, lowers[i])
+                    probed += lowers[i]
+                    remaining = n - i - 1
+                    bound = probed + (low * remaining if remaining else 0.0)
+                    if bound >= n * beta + slack(n * beta, probed, low * remaining if remaining else 0.0):
+                        return self.storeTransposition(key, depth, bound / n, windowAlpha, windowBeta)
+
+            # Star1
+            total = 0.0
+            for i in range(n):
+                remaining = n - i - 1
+                restHigh = high * remaining if remaining else 0.0
+                restLow = 0.0
+                for lower in lowers[i + 1:]:
+                    restLow += lower
+                childAlpha = n * alpha - total - restHigh
+                childAlpha -= slack(n * alpha, total, restHigh)
+                childBeta = n * beta - total - restLow
+                childBeta += slack(n * beta, total, restLow)
+                successor = successors[i]
+                if successor == None:
+                    successor = state.generateSuccessor(agentIndex, legalMoves[i])
+                score = star(nextAgent, nextDepth, successor, childAlpha, childBeta, probes[i])
+                if score <= childAlpha:
+                    return self.storeTransposition(key, depth, (total + score + restHigh) / n, windowAlpha, windowBeta)
+                if score >= childBeta:
+                    return self.storeTransposition(key, depth, (total + score + restLow) / n, windowAlpha, windowBeta)
+                total += score
+            return self.storeTransposition(key, depth, total / n, windowAlpha, windowBeta)
+
+        def searchRoot(alpha, beta):
+            best_score, best_action = -inf, None
+            for action in self.orderMoves(gameState, 0, gameState.getLegalActions(0)):
+                score = star(1, 0, gameState.generateSuccessor(0, action), alpha, beta)
+                if score > best_score:
+                    best_score, best_action = score, action
+                if score >= beta:
+                    break
+                alpha = max(alpha, score)
+            return best_score, best_action
+
+        self.startSearch()
+        if gameState is self.rootState and self.rootAction != None:
+            low = self.searchScore - StarExpectimaxAgent.ASPIRATION_WINDOW
+            high = self.searchScore + StarExpectimaxAgent.ASPIRATION_WINDOW
+            score, action = searchRoot(low, high)
+            if low < score < high:
+                self.searchScore = score
+                return action
+        self.searchScore, action = searchRoot(-inf, inf)
+        return action
 ###  QUESTION 5  ###
 def betterEvaluationFunction(currentGameState: GameState):
     """
@@ -650,7 +1170,7 @@ def betterEvaluationFunction(currentGameState):
         return -999999.0
         
     # --- 3. FOOD (Breadcrumbs) ---
-    foodList = food.asList()
+    foodList = currentGameState.getFoodPositions()
     food_score = 0
     if foodList:
         closest_food_pos = min(foodList, key=lambda f: manhattanDistance(pos, f))
@@ -658,7 +1178,7 @@ def betterEvaluationFunction(currentGameState):
         
         # Penalize for having food left and for being far from it.
         # This ensures EATING (count decreases) is always better than JUST STANDING NEAR.
-        food_score -= 20.0 * len(foodList)  # Big penalty for existing food
+        food_score -= 20.0 * currentGameState.getFoodCount()  # Big penalty for existing food
         food_score -= 2.0 * dist_to_food    # Smaller penalty for distance
     
     # --- 4. GHOSTS (The Meat) ---
@@ -713,7 +1233,8 @@ def betterEvaluationFunction(currentGameState):
     # Tie breaker: random small noise or positional?
     tie_breaker = 0
     
-    return current_score + food_score + ghost_score + capsule_score
+    return max(-999999.0, min(999999.0, current_score + food_score + ghost_score + capsule_score))
+betterEvaluationFunction.bounds = (-999999.0, 999999.0)
 
       # Abbreviation
 better = betterEvaluationFunction
@@ -148,7 +148,8 @@ def run(lay, layName, pac, ghosts, disp, nGames=1, name='games'):
     starttime = time.time()
     print('*** Running %s on' % name, layName, '%d time(s).' % nGames)
     games = pacman.runGames(lay, pac, ghosts, disp,
-                            nGames, False, catchExceptions=True, timeout=120)
+                            nGames, False, catchExceptions=True, timeout=120,
+                            deepCopyStates=True)
     print('*** Finished running %s on' % name, layName,
           'after %d seconds.' % (time.time() - starttime))
     stats = {'time': time.time() - starttime, 'wins': [g.state.isWin() for g in games].count(True), 'games': games, 'scores': [g.state.getScore() for g in games],
@@ -345,8 +346,12 @@ class PacmanGameTreeTest(testClasses.TestCase):
                            altDepthActions, partialPlyBugActions)
         # check return codes and assign grades
         disp = self.question.getDisplay()
-        stats = run(lay, self.layout_name, pac, [DirectionalGhost(
-            i + 1) for i in range(2)], disp, name=self.alg)
+        GameState.setExploredHook(pacman.recordExploredStates)
+        try:
+            stats = run(lay, self.layout_name, pac, [DirectionalGhost(
+                i + 1) for i in range(2)], disp, name=self.alg)
+        finally:
+            GameState.setExploredHook(None)
         if stats['timeouts'] > 0:
             self.addMessage('Agent timed out on smallClassic.  No credit')
             return self.testFail(grades)
@@ -395,8 +400,12 @@ class PacmanGameTreeTest(testClasses.TestCase):
             ourPacOptions = {}
         pac = PolyAgent(self.seed, multiAgents, ourPacOptions, self.depth)
         disp = self.question.getDisplay()
-        run(lay, self.layout_name, pac, [DirectionalGhost(
-            i + 1) for i in range(2)], disp, name=self.alg)
+        GameState.setExploredHook(pacman.recordExploredStates)
+        try:
+            run(lay, self.layout_name, pac, [DirectionalGhost(
+                i + 1) for i in range(2)], disp, name=self.alg)
+        finally:
+            GameState.setExploredHook(None)
         (optimalActions, altDepthActions, partialPlyBugActions) = pac.getTraces()
         # recover traces and record to file
         handle = open(filePath, 'w')
@@ -510,7 +519,8 @@ class EvalAgentTest(testClasses.TestCase):
 
         random.seed(self.seed)
         games = pacman.runGames(lay, agent, self.ghosts, disp, self.numGames,
-                                False, catchExceptions=True, timeout=self.maxTime)
+                                False, catchExceptions=True, timeout=self.maxTime,
+                                deepCopyStates=True)
         totalTime = time.time() - startTime
 
         stats = {'time': totalTime, 'wins': [g.state.isWin() for g in games].count(True),
@@ -43,8 +43,11 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import BitGrid
 from util import nearestPoint
 from util import manhattanDistance
+from gameResults import GameResult, ResultsSink
+from gameReplay import ReplayWriter
 import util
 import layout
 import sys
@@ -52,6 +55,13 @@ import types
 import time
 import random
 import os
+import hashlib
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except:
+    _NUMPY_ENABLED = False
 
 ###################################################
 # YOUR INTERFACE TO THE PACMAN WORLD: A GameState #
@@ -77,15 +87,34 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
+    # Instrumentation called as exploredHook(state, successor) by every
+    # generateSuccessor.  It is off by default; the autograder installs
+    # recordExploredStates to check how many states a search expands.
+    exploredHook = None
+
+    # static variable keeps the Zobrist keys of the states recordExploredStates has seen
     explored = set()
 
+    # The planes of toArrays, in the order batchArrays stacks them
+    ARRAY_PLANES = ('walls', 'food', 'capsules', 'pacman', 'ghosts', 'scaredTimers')
+
+    # toArrays cache; cleared by applyMove and undo, which change the state in place
+    _arrays = None
+
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
+        tmp = GameState.explored
         GameState.explored = set()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def setExploredHook(hook):
+        """
+        Installs hook(state, successor) to be called by generateSuccessor, or
+        turns the instrumentation off when hook is None.
+        """
+        GameState.exploredHook = hook
+    setExploredHook = staticmethod(setExploredHook)
+
     def getLegalActions(self, agentIndex=0):
         """
         Returns the legal actions for the agent specified.
@@ -109,29 +138,113 @@ class GameState:
 
         # Copy current state
         state = GameState(self)
+        state._applyRules(agentIndex, action)
+        state.data.updateZobristKey(self.data)
+        if GameState.exploredHook != None:
+            GameState.exploredHook(self, state)
+        return state
+
+    def iterSuccessors(self, agentIndex, order=None, reuse=False):
+        """
+        Lazily yields (action, successor) pairs for the agent's legal actions.
+
+        Successors are only built as the caller asks for them, so a search
+        that stops early (e.g. on an alpha-beta cutoff) never pays for the
+        remaining siblings.  order, if given, is called with the list of
+        legal actions and returns them in the order they should be tried.
+
+        With reuse=True every pair yields the same scratch GameState, moved
+        to the successor with applyMove and restored once the caller asks
+        for the next pair.  Only use this when the successor is not kept
+        after the loop body; call deepCopy() on it otherwise.
+        """
+        actions = self.getLegalActions(agentIndex)
+        if order != None:
+            actions = order(actions)
+        if not reuse:
+            for action in actions:
+                yield action, self.generateSuccessor(agentIndex, action)
+            return
+        scratch = None
+        for action in actions:
+            if scratch == None:
+                scratch = self.deepCopy()
+            token = scratch.applyMove(agentIndex, action)
+            yield action, scratch
+            scratch.undo(token)
+
+    def applyMove(self, agentIndex, action):
+        """
+        Applies the action to this state in place, under exactly the rules
+        generateSuccessor uses, and returns a token for undo().
+
+        This lets a search walk the game tree on a single private state
+        (e.g. one made with deepCopy) instead of allocating a new GameState
+        per node; call deepCopy() on the leaves that must outlive the walk.
+        States being modified this way must not be shared with the Game or
+        stored in sets and dictionaries, and are not passed to exploredHook.
+        """
+        if self.isWin() or self.isLose():
+            raise Exception('Can\'t generate a successor of a terminal state.')
 
+        data = self.data
+        prevAgents = [(agentState.configuration, agentState.scaredTimer)
+                      for agentState in data.agentStates]
+        token = (data.food, data.capsules, data._eaten, data.score, data.scoreChange,
+                 data._zobristKey, data._agentMoved, data._foodEaten, data._foodAdded,
+                 data._capsuleEaten, data._numFood, data._foodPositions, prevAgents)
+
+        # Reset the per-move bookkeeping, as GameStateData(prevState) does
+        data._foodEaten = None
+        data._foodAdded = None
+        data._capsuleEaten = None
+        data._agentMoved = None
+        data.scoreChange = 0
+
+        self._applyRules(agentIndex, action)
+        data.deriveZobristKey(token[5], token[3], prevAgents)
+        self._arrays = None
+        return token
+
+    def undo(self, token):
+        """
+        Reverts the applyMove call that returned token.  Moves must be undone
+        in the reverse order they were applied.
+        """
+        data = self.data
+        (data.food, data.capsules, data._eaten, data.score, data.scoreChange,
+         data._zobristKey, data._agentMoved, data._foodEaten, data._foodAdded,
+         data._capsuleEaten, data._numFood, data._foodPositions, prevAgents) = token
+        self._arrays = None
+        for agentState, (configuration, scaredTimer) in zip(data.agentStates, prevAgents):
+            agentState.configuration = configuration
+            agentState.scaredTimer = scaredTimer
+        data._win = False
+        data._lose = False
+
+    def _applyRules(self, agentIndex, action):
+        """
+        Applies the effects of the action to this state's data in place.
+        """
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
-            PacmanRules.applyAction(state, action)
+            self.data._eaten = [False for i in range(self.getNumAgents())]
+            PacmanRules.applyAction(self, action)
         else:                # A ghost is moving
-            GhostRules.applyAction(state, action, agentIndex)
+            GhostRules.applyAction(self, action, agentIndex)
 
         # Time passes
         if agentIndex == 0:
-            state.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
+            self.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
         else:
-            GhostRules.decrementTimer(state.data.agentStates[agentIndex])
+            GhostRules.decrementTimer(self.data.agentStates[agentIndex])
 
         # Resolve multi-agent effects
-        GhostRules.checkDeath(state, agentIndex)
+        GhostRules.checkDeath(self, agentIndex)
 
         # Book keeping
-        state.data._agentMoved = agentIndex
-        state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
-        return state
+        self.data._agentMoved = agentIndex
+        self.data.score += self.data.scoreChange
 
     def getLegalPacmanActions(self):
         return self.getLegalActions(0)
@@ -170,6 +283,17 @@ class GameState:
     def getGhostPositions(self):
         return [s.getPosition() for s in self.getGhostStates()]
 
+    def getVisibleGhosts(self):
+        """
+        Returns the states of the ghosts Pacman can see along the direction
+        it is facing.
+        """
+        pacman = self.data.agentStates[0].configuration
+        layout = self.data.layout
+        return [ghost for ghost in self.getGhostStates()
+                if ghost.configuration != None and
+                layout.isVisibleFrom(ghost.getPosition(), pacman.getPosition(), pacman.getDirection())]
+
     def getNumAgents(self):
         return len(self.data.agentStates)
 
@@ -179,11 +303,29 @@ class GameState:
     def getCapsules(self):
         """
         Returns a list of positions (x,y) of the remaining capsules.
+
+        The list is a copy: successor states share the underlying one.
         """
-        return self.data.capsules
+        return self.data.capsules[:]
 
     def getNumFood(self):
-        return self.data.food.count()
+        return self.data.getFoodCount()
+
+    def getFoodCount(self):
+        """
+        Returns the number of food pellets left.  This is a cached count, so
+        it is cheaper than counting getFood().
+        """
+        return self.data.getFoodCount()
+
+    def getFoodPositions(self):
+        """
+        Returns a frozenset of the (x,y) positions of the remaining food.
+
+        Unlike getFood().asList(), the grid is scanned only once; successors
+        share their parent's set, or a copy without the pellet they ate.
+        """
+        return self.data.getFoodPositions()
 
     def getFood(self):
         """
@@ -240,6 +382,72 @@ class GameState:
         state.data = self.data.deepCopy()
         return state
 
+    def readOnlyView(self):
+        """
+        Returns a GameStateView of this state, which is much cheaper than a
+        deepCopy when the receiver only reads it.
+        """
+        return GameStateView(self)
+
+    def toArrays(self):
+        """
+        Returns a dict from each name in ARRAY_PLANES to a read-only
+        (width, height) float32 NumPy array: walls (the layout's shared
+        array), food, capsules, Pacman's position, the number of ghosts on
+        each cell and the largest scared timer of the ghosts there.  The
+        arrays are built once per state.
+        """
+        if self._arrays == None:
+            batch = GameState.batchArrays([self])
+            arrays = {'walls': self.data.layout.getWallsArray()}
+            for name in GameState.ARRAY_PLANES[1:]:
+                arrays[name] = batch[name][0]
+            self._arrays = arrays
+        return self._arrays
+
+    def batchArrays(states):
+        """
+        Returns the planes of toArrays for many states on the same layout, as
+        a dict from plane name to a (len(states), width, height) array.
+
+        The arrays are filled with a few NumPy operations over all states at
+        once; walls is a broadcast view of the layout's shared array.
+        """
+        if not _NUMPY_ENABLED:
+            raise Exception('GameState arrays need numpy')
+        layout = states[0].data.layout
+        shape = (len(states), layout.width, layout.height)
+        arrays = {'walls': numpy.broadcast_to(layout.getWallsArray(), shape)}
+        arrays['food'] = BitGrid.stackArrays([state.data.food for state in states]).astype(numpy.float32)
+
+        arrays['capsules'] = numpy.zeros(shape, numpy.float32)
+        capsules = numpy.array([(i, x, y) for i, state in enumerate(states)
+                                for x, y in state.data.capsules], numpy.intp).reshape(-1, 3)
+        arrays['capsules'][capsules[:, 0], capsules[:, 1], capsules[:, 2]] = 1
+
+        # One row per placed agent: state index, position, isPacman, scared timer
+        agents = numpy.array([(i,) + agentState.configuration.pos + (agentState.isPacman, agentState.scaredTimer)
+                              for i, state in enumerate(states)
+                              for agentState in state.data.agentStates
+                              if agentState.configuration != None], numpy.float64).reshape(-1, 5)
+        index = agents[:, 0].astype(numpy.intp)
+        xs = (agents[:, 1] + 0.5).astype(numpy.intp)
+        ys = (agents[:, 2] + 0.5).astype(numpy.intp)
+        isPacman = agents[:, 3] > 0
+        isGhost = ~isPacman
+        arrays['pacman'] = numpy.zeros(shape, numpy.float32)
+        arrays['pacman'][index[isPacman], xs[isPacman], ys[isPacman]] = 1
+        arrays['ghosts'] = numpy.zeros(shape, numpy.float32)
+        numpy.add.at(arrays['ghosts'], (index[isGhost], xs[isGhost], ys[isGhost]), 1)
+        arrays['scaredTimers'] = numpy.zeros(shape, numpy.float32)
+        numpy.maximum.at(arrays['scaredTimers'], (index[isGhost], xs[isGhost], ys[isGhost]),
+                         agents[isGhost, 4])
+
+        for array in arrays.values():
+            array.setflags(write=False)
+        return arrays
+    batchArrays = staticmethod(batchArrays)
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -262,6 +470,66 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+
+class GameStateView(GameState):
+    """
+    A read-only view of a GameState, handed to agents by Game.run in place
+    of a deep copy.
+
+    The view shares the viewed state's data instead of copying it.  Its
+    accessors return copies of the mutable parts (food, capsules and ghost
+    states), and applyMove copies the data before the first change, so
+    anything done through the GameState API leaves the viewed state alone.
+    Agents that write to state.data directly must be given deep copies
+    instead (see the deepCopyStates option of runGames).
+    """
+
+    def __init__(self, state):
+        self.data = state.data
+        self._ownsData = False
+
+    def getGhostStates(self):
+        return [agentState.copy() for agentState in self.data.agentStates[1:]]
+
+    def getGhostState(self, agentIndex):
+        return GameState.getGhostState(self, agentIndex).copy()
+
+    def getCapsules(self):
+        return self.data.capsules[:]
+
+    def getFood(self):
+        return self.data.food.copy()
+
+    def applyMove(self, agentIndex, action):
+        if not self._ownsData:
+            self.data = self.data.deepCopy()
+            self._ownsData = True
+        return GameState.applyMove(self, agentIndex, action)
+
+    def readOnlyView(self):
+        return self
+
+
+def recordExploredStates(state, successor):
+    """
+    Explored hook that records the distinct states generateSuccessor has
+    seen, by Zobrist key, in GameState.explored.
+    """
+    GameState.explored.add(hash(state))
+    GameState.explored.add(hash(successor))
+
+
+class ExploredCounter:
+    """
+    A cheap explored hook that only counts the successors generated.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, state, successor):
+        self.count += 1
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -283,11 +551,13 @@ class ClassicGameRules:
     def __init__(self, timeout=30):
         self.timeout = timeout
 
-    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False):
+    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False, deepCopyStates=False, turbo=False, recordMoves=True):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize(layout, len(ghostAgents))
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        game = Game(agents, display, self, catchExceptions=catchExceptions,
+                    deepCopyStates=deepCopyStates, turbo=turbo,
+                    recordMoves=recordMoves)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -348,23 +618,31 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions(state.getPacmanState().configuration, state.data.layout.walls)
+        return list(PacmanRules._legalActions(state))
     getLegalActions = staticmethod(getLegalActions)
 
+    def _legalActions(state):
+        conf = state.data.agentStates[0].configuration
+        actions = state.data.layout.legalPacmanActions.get(conf.pos)
+        if actions is None:
+            # Not on a precomputed cell (e.g. between grid points)
+            return Actions.getPossibleActions(conf, state.data.layout.walls)
+        return actions
+    _legalActions = staticmethod(_legalActions)
+
     def applyAction(state, action):
         """
         Edits the state to reflect the results of the action.
         """
-        legal = PacmanRules.getLegalActions(state)
+        legal = PacmanRules._legalActions(state)
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
         pacmanState = state.data.agentStates[0]
 
         # Update Configuration
-        vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
-        pacmanState.configuration = pacmanState.configuration.generateSuccessor(
-            vector)
+        pacmanState.configuration = pacmanState.configuration.generateSuccessorByCode(
+            Directions.CODES[action], PacmanRules.PACMAN_SPEED)
 
         # Eat
         next = pacmanState.configuration.getPosition()
@@ -379,16 +657,20 @@ class PacmanRules:
         # Eat food
         if state.data.food[x][y]:
             state.data.scoreChange += 10
+            # Derived from the set inherited from the parent, before the
+            # grid changes, so only the first state ever scans the grid
+            state.data._foodPositions = state.data.getFoodPositions().difference((position,))
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
             state.data._foodEaten = position
-            # TODO: cache numFood?
-            numFood = state.getNumFood()
+            state.data._numFood = state.data.getFoodCount() - 1
+            numFood = state.data._numFood
             if numFood == 0 and not state.data._lose:
                 state.data.scoreChange += 500
                 state.data._win = True
         # Eat capsule
         if(position in state.getCapsules()):
+            state.data.capsules = state.data.capsules[:]
             state.data.capsules.remove(position)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
@@ -408,7 +690,16 @@ class GhostRules:
         Ghosts cannot stop, and cannot turn around unless they
         reach a dead end, but can turn 90 degrees at intersections.
         """
+        return list(GhostRules._legalActions(state, ghostIndex))
+    getLegalActions = staticmethod(getLegalActions)
+
+    def _legalActions(state, ghostIndex):
         conf = state.getGhostState(ghostIndex).configuration
+        byDirection = state.data.layout.legalGhostActions.get(conf.pos)
+        if byDirection is not None and conf.direction in byDirection:
+            return byDirection[conf.direction]
+
+        # Not on a precomputed cell (e.g. between grid points)
         possibleActions = Actions.getPossibleActions(
             conf, state.data.layout.walls)
         reverse = Actions.reverseDirection(conf.direction)
@@ -417,11 +708,11 @@ class GhostRules:
         if reverse in possibleActions and len(possibleActions) > 1:
             possibleActions.remove(reverse)
         return possibleActions
-    getLegalActions = staticmethod(getLegalActions)
+    _legalActions = staticmethod(_legalActions)
 
     def applyAction(state, action, ghostIndex):
 
-        legal = GhostRules.getLegalActions(state, ghostIndex)
+        legal = GhostRules._legalActions(state, ghostIndex)
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
@@ -429,9 +720,8 @@ class GhostRules:
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0:
             speed /= 2.0
-        vector = Actions.directionToVector(action, speed)
-        ghostState.configuration = ghostState.configuration.generateSuccessor(
-            vector)
+        ghostState.configuration = ghostState.configuration.generateSuccessorByCode(
+            Directions.CODES[action], speed)
     applyAction = staticmethod(applyAction)
 
     def decrementTimer(ghostState):
@@ -463,6 +753,7 @@ class GhostRules:
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -543,7 +834,9 @@ def readCommand(argv):
     parser.add_option('-r', '--recordActions', action='store_true', dest='record',
                       help='Writes game histories to a file (named by the time they were played)', default=False)
     parser.add_option('--replay', dest='gameToReplay',
-                      help='A recorded game file (pickle) to replay', default=None)
+                      help='A recorded game file to replay', default=None)
+    parser.add_option('--replayFrom', dest='replayFrom', type='int',
+                      help=default('The move from which to show a replayed game'), default=0)
     parser.add_option('-a', '--agentArgs', dest='agentArgs',
                       help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
     parser.add_option('-x', '--numTraining', dest='numTraining', type='int',
@@ -554,11 +847,25 @@ def readCommand(argv):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--deepCopyStates', action='store_true', dest='deepCopyStates',
+                      help='Give agents deep copies of the game state instead of read-only views', default=False)
+    parser.add_option('--turbo', action='store_true', dest='turbo',
+                      help='Headless fast simulation: no display, no agent time limits', default=False)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of processes to spread independent games over'), default=1)
+    parser.add_option('--seed', dest='seed', type='int',
+                      help='Master seed from which every game of the batch gets its own seed', default=None)
+    parser.add_option('--results', dest='results',
+                      help='File to stream per-game results to (.csv for CSV, JSON lines otherwise)', default=None)
+    parser.add_option('--reportEvery', dest='reportEvery', type='int',
+                      help=default('Print running statistics every N games (0 for never)'), default=0)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
         raise Exception('Command line input not understood: ' + str(otherjunk))
     args = dict()
+    if options.workers > 1 and not (options.quietGraphics or options.turbo):
+        raise Exception('Games spread over --workers cannot be displayed; add -q or --turbo')
 
     # Fix the random seed
     if options.fixRandomSeed:
@@ -571,7 +878,7 @@ def readCommand(argv):
 
     # Choose a Pacman agent
     noKeyboard = options.gameToReplay == None and (
-        options.textGraphics or options.quietGraphics)
+        options.textGraphics or options.quietGraphics or options.turbo)
     pacmanType = loadAgent(options.pacman, noKeyboard)
     agentOpts = parseAgentArgs(options.agentArgs)
     if options.numTraining > 0:
@@ -591,7 +898,7 @@ def readCommand(argv):
     args['ghosts'] = [ghostType(i+1) for i in range(options.numGhosts)]
 
     # Choose a display format
-    if options.quietGraphics:
+    if options.quietGraphics or options.turbo:
         import textDisplay
         args['display'] = textDisplay.NullGraphics()
     elif options.textGraphics:
@@ -606,17 +913,33 @@ def readCommand(argv):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['deepCopyStates'] = options.deepCopyStates
+    args['turbo'] = options.turbo
+    args['workers'] = options.workers
+    args['seed'] = options.seed
+    args['results'] = options.results
+    args['reportEvery'] = options.reportEvery
+    args['keepGames'] = False
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
         print('Replaying recorded game %s.' % options.gameToReplay)
+        import gameReplay
+        if gameReplay.isRecording(options.gameToReplay):
+            gameReplay.playRecording(options.gameToReplay, args['display'],
+                                     options.replayFrom)
+            sys.exit(0)
+        # Recordings from older versions are pickles
         import pickle
-        f = open(options.gameToReplay)
+        f = open(options.gameToReplay, 'rb')
         try:
             recorded = pickle.load(f)
         finally:
             f.close()
+        # Their pickled Layout predates the tables the rules now rely on
+        recorded['layout'] = layout.internLayout(recorded['layout'].layoutText)
         recorded['display'] = args['display']
+        recorded['startMove'] = options.replayFrom
         replayGame(**recorded)
         sys.exit(0)
 
@@ -651,7 +974,7 @@ def loadAgent(pacman, nographics):
                     ' is not specified in any *Agents.py.')
 
 
-def replayGame(layout, actions, display):
+def replayGame(layout, actions, display, startMove=0):
     import pacmanAgents
     import ghostAgents
     rules = ClassicGameRules()
@@ -659,9 +982,14 @@ def replayGame(layout, actions, display):
                                              for i in range(layout.getNumGhosts())]
     game = rules.newGame(layout, agents[0], agents[1:], display)
     state = game.state
+
+    # Old recordings have no checkpoints, so fast-forward without the display
+    for action in actions[:startMove]:
+        state = state.generateSuccessor(*action)
+        rules.process(state, game)
     display.initialize(state.data)
 
-    for action in actions:
+    for action in actions[startMove:]:
             # Execute the action
         state = state.generateSuccessor(*action)
         # Change the display
@@ -672,49 +1000,208 @@ def replayGame(layout, actions, display):
     display.finish()
 
 
-def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30):
+def gameSeed(masterSeed, gameIndex):
+    """
+    Returns the random seed for game number gameIndex of a seeded batch.  It
+    depends only on the master seed and the index, never on which worker
+    process ends up playing the game.
+    """
+    key = ('%s:%d' % (masterSeed, gameIndex)).encode('utf-8')
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], 'big')
+
+
+# Per-process state of a runParallelGames worker, set up by _initWorker
+_WORKER_CONTEXT = {}
+
+
+def _initWorker(layoutText, pickledAgents, gameOptions):
+    _WORKER_CONTEXT['layout'] = layout.internLayout(layoutText)
+    _WORKER_CONTEXT['agents'] = pickledAgents
+    _WORKER_CONTEXT['options'] = gameOptions
+
+
+def _playSeededGame(task):
+    """
+    Plays one game of a seeded batch with fresh copies of the agents.
+    """
+    import pickle
+    import textDisplay
+    gameIndex, seed = task
+    pacman, ghosts = pickle.loads(_WORKER_CONTEXT['agents'])
+    catchExceptions, timeout, deepCopyStates, turbo, record = _WORKER_CONTEXT['options']
+    random.seed(seed)
+    rules = ClassicGameRules(timeout)
+    rules.quiet = True
+    game = rules.newGame(_WORKER_CONTEXT['layout'], pacman, ghosts,
+                         textDisplay.NullGraphics(), True, catchExceptions,
+                         deepCopyStates, turbo, recordMoves=False)
+    if record:
+        game.recorder = newRecorder(game, gameIndex, seed)
+    startTime = time.time()
+    try:
+        game.run()
+    finally:
+        if game.recorder != None:
+            game.recorder.close()
+    return GameResult.fromGame(game, gameIndex, seed, time.time() - startTime)
+
+
+def newRecorder(game, gameIndex, seed=None):
+    """
+    Returns a ReplayWriter for the game, in a file named after the game
+    number and the time it was played.
+    """
+    fname = ('recorded-game-%d' % (gameIndex + 1)) + \
+        '-'.join([str(t) for t in time.localtime()[1:6]])
+    return ReplayWriter(fname, game.state.data.layout, len(game.agents), seed)
+
+
+def iterParallelGames(layout, pacman, ghosts, numGames, workers=1, seed=None, catchExceptions=False, timeout=30, deepCopyStates=False, turbo=False, record=False):
+    """
+    Plays numGames independent games on a pool of worker processes and
+    yields their GameResults in game order as they finish.
+
+    Every game gets its own seed from gameSeed and starts from a fresh copy
+    of the agents, so the results are the same for any number of workers.
+    Each worker receives the layout and the pickled agents once.
+    """
+    import pickle
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    tasks = [(i, gameSeed(seed, i)) for i in range(numGames)]
+    initArgs = (layout.layoutText, pickle.dumps((pacman, ghosts)),
+                (catchExceptions, timeout, deepCopyStates, turbo, record))
+    if workers <= 1:
+        _initWorker(*initArgs)
+        for task in tasks:
+            yield _playSeededGame(task)
+        return
+
+    import multiprocessing
+    chunkSize = max(1, len(tasks) // (workers * 4))
+    pool = multiprocessing.Pool(workers, _initWorker, initArgs)
+    try:
+        for result in pool.imap(_playSeededGame, tasks, chunkSize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def runParallelGames(layout, pacman, ghosts, numGames, workers=1, seed=None, catchExceptions=False, timeout=30, deepCopyStates=False, turbo=False, record=False):
+    """
+    Returns the list of GameResults from iterParallelGames.
+    """
+    return list(iterParallelGames(layout, pacman, ghosts, numGames, workers, seed,
+                                  catchExceptions, timeout, deepCopyStates, turbo,
+                                  record))
+
+
+def printSummary(scores, wins):
+    winRate = wins.count(True) / float(len(wins))
+    print('Average Score:', sum(scores) / float(len(scores)))
+    print('Scores:       ', ', '.join([str(score) for score in scores]))
+    print('Win Rate:      %d/%d (%.2f)' %
+          (wins.count(True), len(wins), winRate))
+    print('Record:       ', ', '.join(
+        [['Loss', 'Win'][int(w)] for w in wins]))
+
+
+def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30, deepCopyStates=False, turbo=False, workers=1, seed=None, results=None, keepGames=True, reportEvery=0):
+    """
+    Plays numGames games and returns the Games played after the training
+    games.  When workers > 1, the games are played independently by
+    iterParallelGames and GameResults are returned instead.  A seed gives
+    game i the random seed gameSeed(seed, i) either way.
+
+    Every finished game is passed to a ResultsSink, which writes it to the
+    results file (if any) and reports running statistics every reportEvery
+    games.  With keepGames=False nothing is retained and [] is returned.
+    """
+    sink = ResultsSink(results, reportEvery)
+    try:
+        if workers > 1:
+            return _runSeededGames(layout, pacman, ghosts, numGames, record, numTraining,
+                                   catchExceptions, timeout, deepCopyStates, turbo,
+                                   workers, seed, sink, keepGames)
+        return _runSequentialGames(layout, pacman, ghosts, display, numGames, record, numTraining,
+                                   catchExceptions, timeout, deepCopyStates, turbo,
+                                   seed, sink, keepGames)
+    finally:
+        sink.close()
+
+
+def _runSeededGames(layout, pacman, ghosts, numGames, record, numTraining, catchExceptions, timeout, deepCopyStates, turbo, workers, seed, sink, keepGames):
+    if numTraining > 0:
+        raise Exception('Training games need sequential games; drop --workers')
+    startTime = time.time()
+    kept, scores, wins = [], [], []
+    for result in iterParallelGames(layout, pacman, ghosts, numGames, workers, seed,
+                                    catchExceptions, timeout, deepCopyStates, turbo,
+                                    record):
+        sink.add(result)
+        scores.append(result.score)
+        wins.append(result.win)
+        if keepGames:
+            kept.append(result)
+    if numGames > 0:
+        printSummary(scores, wins)
+        elapsed = time.time() - startTime
+        print('Games/second:   %.1f' % (numGames / max(elapsed, 1e-9)))
+        if sink.path is not None or sink.reportEvery > 0:
+            print(sink.summary())
+    return kept
+
+
+def _runSequentialGames(layout, pacman, ghosts, display, numGames, record, numTraining, catchExceptions, timeout, deepCopyStates, turbo, seed, sink, keepGames):
     import __main__
     __main__.__dict__['_display'] = display
 
     rules = ClassicGameRules(timeout)
-    games = []
+    games, scores, wins = [], [], []
+    startTime = time.time()
 
     for i in range(numGames):
         beQuiet = i < numTraining
-        if beQuiet:
+        gameSeedValue = None
+        if seed is not None:
+            gameSeedValue = gameSeed(seed, i)
+            random.seed(gameSeedValue)
+        if turbo:
+            gameDisplay = None
+        elif beQuiet:
                 # Suppress output and graphics
             import textDisplay
             gameDisplay = textDisplay.NullGraphics()
-            rules.quiet = True
         else:
             gameDisplay = display
-            rules.quiet = False
         game = rules.newGame(layout, pacman, ghosts,
-                             gameDisplay, beQuiet, catchExceptions)
-        game.run()
-        if not beQuiet:
-            games.append(game)
-
+                             gameDisplay, beQuiet or turbo, catchExceptions, deepCopyStates,
+                             turbo, recordMoves=not turbo)
         if record:
-            import time
-            import pickle
-            fname = ('recorded-game-%d' % (i + 1)) + \
-                '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
+            game.recorder = newRecorder(game, i, gameSeedValue)
+        gameStart = time.time()
+        try:
+            game.run()
+        finally:
+            if game.recorder != None:
+                game.recorder.close()
+        if not beQuiet:
+            result = GameResult.fromGame(game, i, gameSeedValue, time.time() - gameStart)
+            sink.add(result)
+            scores.append(result.score)
+            wins.append(result.win)
+            if keepGames:
+                games.append(game)
 
     if (numGames-numTraining) > 0:
-        scores = [game.state.getScore() for game in games]
-        wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True) / float(len(wins))
-        print('Average Score:', sum(scores) / float(len(scores)))
-        print('Scores:       ', ', '.join([str(score) for score in scores]))
-        print('Win Rate:      %d/%d (%.2f)' %
-              (wins.count(True), len(wins), winRate))
-        print('Record:       ', ', '.join(
-            [['Loss', 'Win'][int(w)] for w in wins]))
+        printSummary(scores, wins)
+        if sink.path is not None or sink.reportEvery > 0:
+            print(sink.summary())
+    if turbo:
+        elapsed = time.time() - startTime
+        print('Games/second:   %.1f' % (numGames / max(elapsed, 1e-9)))
 
     return games
 
@@ -0,0 +1,224 @@
+# pacmanEnv.py
+# ------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Gym-style environments over the Pacman rules, for training and evaluating
+learned agents outside of Game.run.
+
+PacmanEnv plays one game: step(action) moves Pacman, then lets the ghost
+agents answer, and returns (state, reward, done, info) with the score
+change as the reward.  VecPacmanEnv steps many games in lockstep, returns
+their observations as one NumPy array of planes (see PLANES) and resets
+games as they finish.  NumPy is only needed for VecPacmanEnv.
+
+To measure throughput:
+
+  python pacmanEnv.py -l mediumClassic -n 16
+"""
+import random
+import sys
+import time
+import util
+import ghostAgents
+from game import Actions, Directions
+from pacman import GameState, gameSeed
+
+try:
+    import numpy
+    _NUMPY_ENABLED = True
+except:
+    _NUMPY_ENABLED = False
+
+PLANES = GameState.ARRAY_PLANES
+
+
+class PacmanEnv:
+    """
+    A single game of Pacman under ClassicGameRules, advanced one Pacman
+    move (plus the ghosts' replies) per step.
+
+    Actions are direction names or their codes in Directions.CODES.  An
+    illegal action is played as Directions.STOP and flagged in the info
+    dict.  Ghosts that publish a getDistribution are sampled with the
+    environment's own random generator, so reset(seed) makes a game
+    reproducible whatever else uses the random module.
+    """
+
+    def __init__(self, layout, ghosts=None, maxMoves=None):
+        if ghosts == None:
+            ghosts = [ghostAgents.RandomGhost(i + 1) for i in range(layout.getNumGhosts())]
+        self.layout = layout
+        self.ghosts = ghosts[:layout.getNumGhosts()]
+        self.maxMoves = maxMoves
+        self.random = random.Random()
+        self._ghostActions = [(i + 1, self._ghostActionFunction(ghost))
+                              for i, ghost in enumerate(self.ghosts)]
+        self.state = None
+        self.numMoves = 0
+        self.done = True
+
+    def _ghostActionFunction(self, ghost):
+        getDistribution = getattr(ghost, 'getDistribution', None)
+        if getDistribution is None:
+            return ghost.getAction
+
+        def chooseAction(state):
+            dist = getDistribution(state)
+            if len(dist) == 0:
+                return Directions.STOP
+            return util.chooseFromDistribution(dist, self.random)
+        return chooseAction
+
+    def reset(self, seed=None):
+        """
+        Starts a new game and returns its initial state.
+        """
+        if seed is not None:
+            self.random.seed(seed)
+        self.state = GameState()
+        self.state.initialize(self.layout, len(self.ghosts))
+        self.numMoves = 0
+        self.done = False
+        return self.state
+
+    def step(self, action):
+        if self.done:
+            raise Exception('The game is over; call reset() to start a new one')
+        if not isinstance(action, str):
+            action = Actions.codeToDirection(int(action))
+        state = self.state
+        startScore = state.getScore()
+        illegal = action not in state.getLegalPacmanActions()
+        if illegal:
+            action = Directions.STOP
+
+        state = state.generateSuccessor(0, action)
+        for ghostIndex, ghostAction in self._ghostActions:
+            if state.isWin() or state.isLose():
+                break
+            state = state.generateSuccessor(ghostIndex, ghostAction(state))
+        self.state = state
+        self.numMoves += 1
+
+        terminal = state.isWin() or state.isLose()
+        truncated = not terminal and self.maxMoves != None and self.numMoves >= self.maxMoves
+        self.done = terminal or truncated
+        info = {'win': state.isWin(), 'illegalAction': illegal,
+                'truncated': truncated, 'numMoves': self.numMoves}
+        return state, state.getScore() - startScore, self.done, info
+
+    def legalActionMask(self):
+        """
+        Returns, for each direction code, whether Pacman may take it now.
+        """
+        legal = self.state.getLegalPacmanActions()
+        return [name in legal for name in Directions.NAMES]
+
+
+class VecPacmanEnv:
+    """
+    Steps numEnvs independent games on the same layout in lockstep.
+
+    Observations are float32 arrays of shape (numEnvs, len(PLANES), width,
+    height).  A game that ends is reset on the spot: its entry in the
+    returned observations is the first state of the next game, and its info
+    dict holds the last state of the finished game under
+    'finalObservation'.
+    """
+
+    def __init__(self, layout, numEnvs, ghosts=None, maxMoves=None):
+        if not _NUMPY_ENABLED:
+            raise Exception('VecPacmanEnv needs numpy')
+        self.layout = layout
+        self.numEnvs = numEnvs
+        self.envs = [PacmanEnv(layout, ghosts, maxMoves) for i in range(numEnvs)]
+        self.observationShape = (len(PLANES), layout.width, layout.height)
+
+    def reset(self, seed=None):
+        for i, env in enumerate(self.envs):
+            if seed is None:
+                env.reset()
+            else:
+                env.reset(gameSeed(seed, i))
+        return self._encode([env.state for env in self.envs])
+
+    def step(self, actions):
+        """
+        Takes one action per game and returns (observations, rewards,
+        dones, infos).
+        """
+        rewards = numpy.zeros(self.numEnvs, numpy.float32)
+        dones = numpy.zeros(self.numEnvs, numpy.bool_)
+        infos = []
+        states = []
+        for i, env in enumerate(self.envs):
+            state, reward, done, info = env.step(actions[i])
+            rewards[i] = reward
+            dones[i] = done
+            if done:
+                info['finalObservation'] = encodeState(state)
+                state = env.reset()
+            states.append(state)
+            infos.append(info)
+        return self._encode(states), rewards, dones, infos
+
+    def _encode(self, states):
+        batch = GameState.batchArrays(states)
+        return numpy.stack([batch[name] for name in PLANES], axis=1)
+
+    def legalActionMasks(self):
+        return numpy.array([env.legalActionMask() for env in self.envs], numpy.bool_)
+
+
+def encodeState(state):
+    """
+    Returns the (len(PLANES), width, height) observation of a single state.
+    """
+    arrays = state.toArrays()
+    return numpy.stack([arrays[name] for name in PLANES])
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE:      python pacmanEnv.py <options>')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the LAYOUT_FILE to play on [Default: %default]')
+    parser.add_option('-n', '--numEnvs', dest='numEnvs', type='int', default=16,
+                      help='the number of games stepped in lockstep [Default: %default]')
+    parser.add_option('-s', '--steps', dest='steps', type='int', default=1000,
+                      help='the number of lockstep steps to take [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    import layout
+    options = readCommand(sys.argv[1:])
+    lay = layout.getLayout(options.layout)
+    if lay == None:
+        raise Exception("The layout " + options.layout + " cannot be found")
+    env = VecPacmanEnv(lay, options.numEnvs)
+    env.reset(seed=0)
+    chooser = random.Random(0)
+    startTime = time.time()
+    for step in range(options.steps):
+        actions = [chooser.choice([code for code, legal in enumerate(mask) if legal])
+                   for mask in env.legalActionMasks()]
+        env.step(actions)
+    elapsed = max(time.time() - startTime, 1e-9)
+    print('Layout:            %s' % options.layout)
+    print('Environments:      %d' % options.numEnvs)
+    print('Steps/second:      %.1f' % (options.steps * options.numEnvs / elapsed))
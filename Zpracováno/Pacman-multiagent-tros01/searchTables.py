@@ -0,0 +1,373 @@
+# searchTables.py
+# ---------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Tables shared by the adversarial searches in multiAgents.py.
+
+To compare the nodes alpha-beta searches with and without move ordering
+on the autograder's question 3 tests, or those searched by another agent
+such as PrincipalVariationAgent (or StarExpectimaxAgent, on question 4):
+
+  python searchTables.py
+  python searchTables.py -p PrincipalVariationAgent -o none
+  python searchTables.py -t test_cases/q4 -b ExpectimaxAgent -p StarExpectimaxAgent -o none
+"""
+from game import Actions
+from util import manhattanDistance
+
+# What a stored value says about the true value of its position
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+_SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parseSize(text):
+    """
+    Parses a memory size such as '64MB', '512KB' or '1000000' into bytes.
+    """
+    text = str(text).strip().upper()
+    for unit in sorted(_SIZE_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * _SIZE_UNITS[unit])
+    return int(float(text))
+
+
+def stateKey(state, agentIndex):
+    """
+    Returns the table key of a state with agentIndex to move, or None for
+    states whose hash is their identity rather than their content (such
+    hashes are reused once the state is freed).
+    """
+    if type(state).__hash__ in (None, object.__hash__):
+        return None
+    return (hash(state), agentIndex)
+
+
+class TranspositionTable:
+    """
+    A fixed-size table of search results keyed by stateKey.
+
+    Each of the table's slots holds two entries.  The depth-preferred one is
+    only replaced by a result searched at least as deep, or by any result
+    once it is left over from an earlier search (see newSearch); results
+    that do not qualify go to the slot's always-replace entry.  A value is
+    only reused for the same remaining depth, so a search with the table
+    returns what it would without it.
+    """
+    # Rough cost of one stored entry, in bytes, used to size the table
+    ENTRY_BYTES = 160
+
+    def __init__(self, maxBytes):
+        self.numSlots = max(1, maxBytes // (2 * TranspositionTable.ENTRY_BYTES))
+        self.deep = [None] * self.numSlots
+        self.recent = [None] * self.numSlots
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def newSearch(self):
+        """
+        Marks the start of a new search, ageing the entries already stored.
+        """
+        self.generation += 1
+
+    def lookup(self, key, depth):
+        """
+        Returns (flag, value) stored for key at this remaining depth, or None.
+        """
+        self.probes += 1
+        slot = hash(key) % self.numSlots
+        for entry in (self.deep[slot], self.recent[slot]):
+            if entry != None and entry[0] == key and entry[1] == depth:
+                self.hits += 1
+                return entry[2], entry[3]
+        return None
+
+    def bestAction(self, key):
+        """
+        Returns the best action stored for key by the deepest search, or None.
+        """
+        slot = hash(key) % self.numSlots
+        best = None
+        for entry in (self.deep[slot], self.recent[slot]):
+            if entry != None and entry[0] == key and entry[4] != None:
+                if best == None or entry[1] > best[1]:
+                    best = entry
+        if best == None:
+            return None
+        return best[4]
+
+    def store(self, key, depth, flag, value, action=None):
+        slot = hash(key) % self.numSlots
+        entry = (key, depth, flag, value, action, self.generation)
+        deep = self.deep[slot]
+        if deep == None or depth >= deep[1] or deep[5] != self.generation:
+            self.deep[slot] = entry
+        else:
+            self.recent[slot] = entry
+
+    def clear(self):
+        self.deep = [None] * self.numSlots
+        self.recent = [None] * self.numSlots
+
+
+def agentPosition(state, agentIndex):
+    """
+    Returns the position of an agent, or None for states that have no
+    positions (such as the autograder's game trees).
+    """
+    if not hasattr(state, 'getPacmanPosition'):
+        return None
+    if agentIndex == 0:
+        return state.getPacmanPosition()
+    return state.getGhostPosition(agentIndex)
+
+
+class MoveOrdering:
+    """
+    Orders the moves of an alpha-beta search so that those most likely to
+    cause a cutoff are searched first, using any of these heuristics:
+
+      tt       the best move stored for the position by the transposition
+               table, or found by the previous iteration of a deepening
+               search
+      killers  the last moves to cause a cutoff at the same ply
+      history  how often a move of the agent from its position has caused
+               a cutoff, weighted by the depth searched below it
+      static   moves taking Pacman toward the nearest food, and ghosts
+               toward Pacman
+
+    Moves are ranked by the first two, then by history and then by the
+    static score; moves that tie keep the order of getLegalActions.
+    """
+    HEURISTICS = ('tt', 'killers', 'history', 'static')
+    NUM_KILLERS = 2
+
+    def __init__(self, heuristics=HEURISTICS):
+        for name in heuristics:
+            if name not in MoveOrdering.HEURISTICS:
+                raise Exception('Unknown move ordering heuristic: ' + name)
+        self.useTableMove = 'tt' in heuristics
+        self.useKillers = 'killers' in heuristics
+        self.useHistory = 'history' in heuristics
+        self.useStatic = 'static' in heuristics
+        self.killers = {}
+        self.history = {}
+
+    def parse(text):
+        """
+        Returns the MoveOrdering named by text: 'all', 'none' (None), or
+        heuristic names joined by '+', as in 'tt+killers'.
+        """
+        text = str(text).strip().lower()
+        if text == 'none':
+            return None
+        if text == 'all':
+            return MoveOrdering()
+        return MoveOrdering(text.split('+'))
+    parse = staticmethod(parse)
+
+    def newSearch(self):
+        """
+        Starts a new search: killers are forgotten and history is halved,
+        so that it favours what worked recently.
+        """
+        self.killers = {}
+        for move in list(self.history):
+            score = self.history[move] >> 1
+            if score:
+                self.history[move] = score
+            else:
+                del self.history[move]
+
+    def order(self, state, agentIndex, ply, legalMoves, tableMove=None):
+        """
+        Returns legalMoves sorted best first for agentIndex, ply plies into
+        the search.
+        """
+        if len(legalMoves) < 2:
+            return legalMoves
+        if not self.useTableMove:
+            tableMove = None
+        killers = ()
+        if self.useKillers:
+            killers = self.killers.get((ply, agentIndex), ())
+        position = None
+        if self.useHistory or self.useStatic:
+            position = agentPosition(state, agentIndex)
+        static = None
+        if self.useStatic and position != None:
+            static = self.staticScores(state, agentIndex, position, legalMoves)
+
+        ranked = []
+        for i, action in enumerate(legalMoves):
+            if action == tableMove:
+                tier = 2
+            elif action in killers:
+                tier = 1
+            else:
+                tier = 0
+            history = 0
+            if self.useHistory:
+                history = self.history.get((agentIndex, position, action), 0)
+            closer = 0
+            if static != None:
+                closer = static[i]
+            ranked.append((-tier, -history, -closer, i, action))
+        ranked.sort()
+        return [entry[4] for entry in ranked]
+
+    def staticScores(self, state, agentIndex, position, legalMoves):
+        """
+        Scores each move by how much closer it takes the agent to its
+        target: the nearest food for Pacman, Pacman for a ghost.
+        """
+        if agentIndex == 0:
+            targets = state.getFoodPositions()
+        else:
+            targets = (state.getPacmanPosition(),)
+        if not targets:
+            return None
+        scores = []
+        for action in legalMoves:
+            successor = Actions.getSuccessor(position, action)
+            scores.append(-min([manhattanDistance(successor, target) for target in targets]))
+        return scores
+
+    def recordCutoff(self, state, agentIndex, ply, action, depth):
+        """
+        Notes that action caused a cutoff ply plies into the search, with
+        depth plies of search left below it.
+        """
+        if self.useKillers:
+            slot = (ply, agentIndex)
+            killers = self.killers.get(slot, ())
+            if action not in killers:
+                self.killers[slot] = ((action,) + killers)[:MoveOrdering.NUM_KILLERS]
+        if self.useHistory:
+            move = (agentIndex, agentPosition(state, agentIndex), action)
+            self.history[move] = self.history.get(move, 0) + depth * depth
+
+
+def countNodes(agent, state):
+    """
+    Returns the number of successor states agent generates to choose a move
+    from state.
+    """
+    from pacman import GameState
+    counter = [0]
+
+    def count(state, successor):
+        counter[0] += 1
+    GameState.setExploredHook(count)
+    try:
+        if hasattr(state, 'problem'):
+            state.problem.reset()
+            agent.getAction(state)
+            return len(state.problem.generatedStates) - 1
+        agent.getAction(state)
+        return counter[0]
+    finally:
+        GameState.setExploredHook(None)
+
+
+def compareSearches(testDir, agent='AlphaBetaAgent', ordering='all', tt=None,
+                    baseline='AlphaBetaAgent', numMoves=20):
+    """
+    Prints the nodes searched by plain baseline and by agent (with
+    ordering and a transposition table of size tt, which the tt heuristic
+    needs) on the game tree and Pacman game tests of baseline in testDir,
+    and checks that both choose the same actions as each other and as the
+    tests' solutions.
+    """
+    import os
+    import random
+    import layout
+    import multiAgents
+    import multiagentTestClasses
+    import testParser
+    from ghostAgents import DirectionalGhost
+    from pacman import GameState
+
+    print('%-34s %10s %10s %7s  %s' % ('Test', baseline[:10], agent[:10], 'Saved', 'Actions'))
+    totals = [0, 0]
+    mismatches = 0
+    for name in sorted(os.listdir(testDir)):
+        if not name.endswith('.test'):
+            continue
+        testDict = testParser.TestParser(os.path.join(testDir, name)).parse()
+        if testDict.get('alg') != baseline:
+            continue
+        depth = testDict['depth']
+        plain = getattr(multiAgents, baseline)(depth=depth)
+        other = getattr(multiAgents, agent)(depth=depth, ordering=ordering, tt=tt)
+        expected = None
+        if testDict['class'] == 'GraphGameTreeTest':
+            states = [multiagentTestClasses.parseTreeProblem(testDict).startState]
+            solution = testParser.TestParser(os.path.join(testDir, name[:-5] + '.solution')).parse()
+            expected = solution['action']
+        elif testDict['class'] == 'PacmanGameTreeTest':
+            # The states along a game the plain agent plays
+            random.seed(int(testDict['seed']))
+            lay = layout.Layout([l.strip() for l in testDict['layout'].split('\n')])
+            state = GameState()
+            state.initialize(lay, 2)
+            ghosts = [DirectionalGhost(i + 1) for i in range(2)]
+            states = []
+            while len(states) < numMoves and not (state.isWin() or state.isLose()):
+                states.append(state)
+                state = state.generateSuccessor(0, plain.getAction(state))
+                for ghost in ghosts:
+                    if state.isWin() or state.isLose():
+                        break
+                    state = state.generateSuccessor(ghost.index, ghost.getAction(state))
+        else:
+            continue
+        counts = [0, 0]
+        same = True
+        for state in states:
+            counts[0] += countNodes(plain, state)
+            counts[1] += countNodes(other, state)
+            action = plain.getAction(state)
+            if other.getAction(state) != action or expected not in (None, action):
+                same = False
+        totals[0] += counts[0]
+        totals[1] += counts[1]
+        mismatches += not same
+        print('%-34s %10d %10d %6.1f%%  %s' % (name[:-5], counts[0], counts[1],
+                                                100.0 * (counts[0] - counts[1]) / max(counts[0], 1),
+                                                same and 'same' or 'DIFFERENT'))
+    print('%-34s %10d %10d %6.1f%%  %d different' % ('Total', totals[0], totals[1],
+                                                     100.0 * (totals[0] - totals[1]) / max(totals[0], 1),
+                                                     mismatches))
+
+
+if __name__ == '__main__':
+    import sys
+    from optparse import OptionParser
+    parser = OptionParser('USAGE:      python searchTables.py <options>')
+    parser.add_option('-t', '--testDir', dest='testDir', default='test_cases/q3',
+                      help='the directory of tests to compare on [Default: %default]')
+    parser.add_option('-p', '--agent', dest='agent', default='AlphaBetaAgent',
+                      help='the search agent to compare [Default: %default]')
+    parser.add_option('-b', '--baseline', dest='baseline', default='AlphaBetaAgent',
+                      help='the plain agent to compare it with, whose tests are used [Default: %default]')
+    parser.add_option('-o', '--ordering', dest='ordering', default='all',
+                      help="the heuristics to order by, joined by '+', or none [Default: %default]")
+    parser.add_option('--tt', dest='tt', default=None,
+                      help='the size of the compared search\'s transposition table, e.g. 16MB')
+    options, otherjunk = parser.parse_args(sys.argv[1:])
+    compareSearches(options.testDir, options.agent, options.ordering, options.tt, options.baseline)